@@ -0,0 +1,67 @@
+import argparse
+import os
+import socket
+import sys
+
+from agent.protocol import (
+    DEFAULT_SOCKET_PATH,
+    FORWARDED_ENVIRONMENT,
+    WORKER_ENVIRONMENT,
+    read_messages,
+    send_message,
+)
+
+
+def main():
+    """Submits build to the build agent and streams its log until the build finishes."""
+
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument(
+        "--agent-socket",
+        default=DEFAULT_SOCKET_PATH,
+        help="Path of the Unix socket build agent listens on.",
+    )
+    parser.add_argument(
+        "script",
+        help="Build script relative to repository root (i.e. 'clang/build_clang.py').",
+    )
+    parser.add_argument(
+        "args", nargs=argparse.REMAINDER, help="Arguments passed to the build script."
+    )
+    args = parser.parse_args()
+
+    root_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = os.path.relpath(os.path.abspath(args.script), root_path)
+    if not os.path.isfile(os.path.join(root_path, script)):
+        script = args.script
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(args.agent_socket)
+        send_message(
+            connection,
+            {
+                "script": script,
+                "args": args.args,
+                "cwd": os.getcwd(),
+                "env": {
+                    name: os.environ.get(name)
+                    for name in FORWARDED_ENVIRONMENT + WORKER_ENVIRONMENT
+                },
+            },
+        )
+        for message in read_messages(connection):
+            if "log" in message:
+                print(message["log"], flush=True)
+            if "status" in message:
+                if message["status"] != "ok":
+                    print(message.get("message", "Build failed!"), file=sys.stderr)
+                    sys.exit(1)
+                if message.get("message"):
+                    print(message["message"], end="")
+                return
+    print("Connection to build agent closed unexpectedly!", file=sys.stderr)
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
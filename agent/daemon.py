@@ -0,0 +1,222 @@
+import contextlib
+import importlib
+import inspect
+import io
+import logging
+import os
+import queue
+import socketserver
+import threading
+from typing import Any, Dict, List, Optional, Type
+
+from pydantic import BaseModel, Field
+
+from agent.protocol import (
+    DEFAULT_SOCKET_PATH,
+    FORWARDED_ENVIRONMENT,
+    WORKER_ENVIRONMENT,
+    read_messages,
+    send_message,
+)
+from archive.cache import UnpackCache
+from cli.app import CliApp, CliContext
+
+
+class BuildAgentArgs(BaseModel):
+    """Runs build agent which keeps clients and unpacked inputs warm between builds."""
+
+    socket_path: Optional[str] = Field(
+        default=None,
+        description=f"Path of the Unix socket to listen on (default '{DEFAULT_SOCKET_PATH}').",
+    )
+
+    cache_path: Optional[str] = Field(
+        default=None,
+        description="Directory where unpacked archives are cached (default '~/.cache/cc-toolchain-agent').",
+    )
+
+    cache_entries: Optional[int] = Field(
+        default=None,
+        description="Maximum number of unpacked archives kept in cache (default 8).",
+    )
+
+
+class _BuildRequest:
+    """Build queued by a client connection."""
+
+    def __init__(
+        self, script: str, args: List[str], cwd: str, env: Dict[str, Optional[str]]
+    ):
+        self.script = script
+        self.args = args
+        self.cwd = cwd
+        self.env = env
+        self.events: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+
+
+class _ForwardingHandler(logging.Handler):
+    """Forwards log records of the running build to the requesting client."""
+
+    def __init__(self, request: _BuildRequest):
+        super().__init__()
+        self._request = request
+        self.setFormatter(
+            logging.Formatter("[%(asctime)s] [%(levelname)s]: %(message)s")
+        )
+
+    def emit(self, record: logging.LogRecord):
+        self._request.events.put({"log": self.format(record)})
+
+
+class BuildAgentApp(CliApp[BuildAgentArgs]):
+    """Runs build agent which keeps clients and unpacked inputs warm between builds."""
+
+    def __init__(self):
+        super().__init__("build-agent")
+        self._root_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self._socket_path = self.args.socket_path or DEFAULT_SOCKET_PATH
+        self._requests: "queue.Queue[_BuildRequest]" = queue.Queue()
+        self._shared = CliContext(
+            worker_pool=self.worker_pool,
+            unpack_cache=UnpackCache(
+                self.args.cache_path
+                or os.path.expanduser("~/.cache/cc-toolchain-agent"),
+                max_entries=self.args.cache_entries or 8,
+            ),
+        )
+
+    def _resolve_app(self, script: str) -> Type[CliApp]:
+        """Finds CLI application class defined by the given script (i.e. 'clang/build_clang.py')."""
+
+        script_path = os.path.abspath(os.path.join(self._root_path, script))
+        if os.path.commonpath([self._root_path, script_path]) != self._root_path:
+            raise ValueError(f"Script '{script}' is outside of the repository!")
+        module_name = os.path.splitext(os.path.relpath(script_path, self._root_path))[
+            0
+        ].replace(os.sep, ".")
+        module = importlib.import_module(module_name)
+
+        for value in vars(module).values():
+            if (
+                inspect.isclass(value)
+                and issubclass(value, CliApp)
+                and value.__module__ == module.__name__
+                and not inspect.isabstract(value)
+            ):
+                return value
+        raise ValueError(f"Script '{script}' does not define CLI application!")
+
+    def _apply_environment(
+        self, env: Dict[str, Optional[str]]
+    ) -> Dict[str, Optional[str]]:
+        """Applies client environment to the build, returns previous values of the changed variables."""
+
+        # Worker pool is shared by all builds, so it cannot follow environment of a single client
+        for name in WORKER_ENVIRONMENT:
+            if name in env and env[name] != os.environ.get(name):
+                raise EnvironmentError(
+                    f"Environment variable '{name}' of the client differs from the build agent, restart the agent!"
+                )
+
+        previous = {}
+        for name in FORWARDED_ENVIRONMENT:
+            if name not in env:
+                continue
+            previous[name] = os.environ.get(name)
+            if env.get(name) is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = env[name]
+        return previous
+
+    def _execute(self, request: _BuildRequest):
+        """Runs single build inside shared context."""
+
+        handler = _ForwardingHandler(request)
+        logging.getLogger().addHandler(handler)
+        previous_cwd = os.getcwd()
+        previous_env: Dict[str, Optional[str]] = {}
+        usage = io.StringIO()
+        try:
+            previous_env = self._apply_environment(request.env)
+            os.chdir(request.cwd)
+            self._shared.argv = request.args
+            self._shared.prog = os.path.basename(request.script)
+            CliApp.activate_context(self._shared)
+            app_class = self._resolve_app(request.script)
+
+            # Usage, help and errors of argument parsing are returned to the client
+            with contextlib.redirect_stdout(usage), contextlib.redirect_stderr(usage):
+                app = app_class()
+            app.run()
+            request.events.put({"status": "ok"})
+        except SystemExit as error:
+            request.events.put(
+                {
+                    "status": "ok" if not error.code else "error",
+                    "message": usage.getvalue(),
+                }
+            )
+        except Exception as error:
+            self.logger.exception(f"Build '{request.script}' failed!")
+            request.events.put({"status": "error", "message": str(error)})
+        finally:
+            CliApp.activate_context(None)
+            self._shared.argv = None
+            self._shared.prog = None
+            os.chdir(previous_cwd)
+            for name, value in previous_env.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+            logging.getLogger().removeHandler(handler)
+
+    def _process_requests(self):
+        """Executes queued builds one after another."""
+        while True:
+            request = self._requests.get()
+            self.logger.info(f"Starting build '{request.script}'...")
+            self._execute(request)
+            self.logger.info(f"Build '{request.script}' finished!")
+
+    def _create_server(self) -> socketserver.ThreadingUnixStreamServer:
+        agent = self
+
+        class RequestHandler(socketserver.BaseRequestHandler):
+            def handle(self):
+                message = next(read_messages(self.request), None)
+                if message is None:
+                    return
+                request = _BuildRequest(
+                    message["script"],
+                    message.get("args", []),
+                    message["cwd"],
+                    message.get("env", {}),
+                )
+                agent._requests.put(request)
+                send_message(
+                    self.request,
+                    {"log": f"Build queued (position {agent._requests.qsize()})."},
+                )
+                while True:
+                    event = request.events.get()
+                    send_message(self.request, event)
+                    if "status" in event:
+                        return
+
+        if os.path.exists(self._socket_path):
+            os.remove(self._socket_path)
+        return socketserver.ThreadingUnixStreamServer(self._socket_path, RequestHandler)
+
+    def run(self):
+        threading.Thread(target=self._process_requests, daemon=True).start()
+        with self._create_server() as server:
+            self.logger.info(f"Build agent listening on '{self._socket_path}'...")
+            try:
+                server.serve_forever()
+            finally:
+                os.remove(self._socket_path)
+
+
+BuildAgentApp.exec(__name__)
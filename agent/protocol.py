@@ -0,0 +1,30 @@
+import json
+import socket
+from typing import Any, Dict, Iterator
+
+DEFAULT_SOCKET_PATH = "/tmp/cc-toolchain-agent.sock"
+"""Default path of the Unix socket the build agent listens on."""
+
+FORWARDED_ENVIRONMENT = ("GITHUB_TOKEN",)
+"""Environment variables of the client applied to its build."""
+
+WORKER_ENVIRONMENT = (
+    "DOCKER_HOST",
+    "DOCKER_HOSTS",
+    "DOCKER_TLS_VERIFY",
+    "DOCKER_CERT_PATH",
+)
+"""Environment variables configuring worker pool of the agent, which must match in the client."""
+
+
+def send_message(connection: socket.socket, message: Dict[str, Any]):
+    """Sends single JSON message terminated by a new line."""
+    connection.sendall(json.dumps(message).encode() + b"\n")
+
+
+def read_messages(connection: socket.socket) -> Iterator[Dict[str, Any]]:
+    """Reads JSON messages (one per line) until the connection is closed."""
+    with connection.makefile("rb") as stream:
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
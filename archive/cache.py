@@ -0,0 +1,165 @@
+from collections import OrderedDict
+import hashlib
+import os
+import shutil
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from archive.extract import extract_archive
+
+
+def _link_or_copy(src: str, dst: str):
+    if os.path.lexists(dst):
+        os.unlink(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+class UnpackCache:
+    """
+    LRU cache of unpacked archives keyed by SHA-256 digest of the archive.
+
+    Cached trees are materialized into requested output directories as hard links,
+    so repeated unpacking of the same archive costs only directory traversal.
+    """
+
+    def __init__(self, root: str, max_entries: int = 8):
+        """
+        Args:
+            root: Directory where unpacked archives are stored.
+            max_entries: Maximum number of unpacked archives kept in cache.
+        """
+
+        self._root = os.path.abspath(root)
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._digests: Dict[Tuple[str, int, int], str] = {}
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        os.makedirs(self._root, exist_ok=True)
+
+        # Restore entries left from previous runs (oldest first)
+        entries = sorted(
+            (
+                entry
+                for entry in os.scandir(self._root)
+                if entry.is_dir() and not entry.name.endswith(".partial")
+            ),
+            key=lambda entry: entry.stat().st_mtime,
+        )
+        for entry in entries:
+            self._entries[entry.name] = entry.path
+
+    @property
+    def root(self) -> str:
+        """Gets directory where unpacked archives are stored."""
+        return self._root
+
+    def digest(self, archive_path: str) -> str:
+        """
+        Calculates SHA-256 digest of the archive (memoized by path, size and modification time).
+
+        Args:
+            archive_path: Path to the archive.
+
+        Returns: Hex digest of the archive content.
+        """
+
+        stat = os.stat(archive_path)
+        key = (os.path.abspath(archive_path), stat.st_size, stat.st_mtime_ns)
+        if key not in self._digests:
+            digest = hashlib.sha256()
+            with open(archive_path, "rb") as archive:
+                for chunk in iter(lambda: archive.read(1024 * 1024), b""):
+                    digest.update(chunk)
+            self._digests[key] = digest.hexdigest()
+        return self._digests[key]
+
+    def get(self, archive_path: str) -> Tuple[str, bool]:
+        """
+        Gets directory with unpacked archive, unpacking it if not cached yet.
+
+        Args:
+            archive_path: Path to the archive (.tar.xz).
+
+        Returns: Path of the unpacked archive and whether it was already cached.
+        """
+
+        digest = self.digest(archive_path)
+        with self._lock:
+            path = self._entries.get(digest)
+            if path is not None and os.path.isdir(path):
+                self._entries.move_to_end(digest)
+                os.utime(path)
+                return path, True
+
+            path = os.path.join(self._root, digest)
+            partial_path = f"{path}.partial"
+            shutil.rmtree(partial_path, ignore_errors=True)
+            extract_archive(archive_path, partial_path)
+            os.rename(partial_path, path)
+            self._entries[digest] = path
+            self._evict()
+            return path, False
+
+    def materialize(self, archive_path: str, output_path: str) -> bool:
+        """
+        Makes content of the archive available in output directory.
+
+        Args:
+            archive_path: Path to the archive (.tar.xz).
+            output_path: Directory where archive content is placed.
+
+        Returns: Whether the archive was already cached.
+        """
+
+        path, hit = self.get(archive_path)
+        shutil.copytree(
+            path,
+            output_path,
+            symlinks=True,
+            copy_function=_link_or_copy,
+            dirs_exist_ok=True,
+        )
+        return hit
+
+    def entries(self) -> List[Tuple[str, str, float]]:
+        """
+        Lists cached archives from the least recently used.
+
+        Returns: List of (digest, path, last use time) tuples.
+        """
+
+        with self._lock:
+            return [
+                (digest, path, os.stat(path).st_mtime)
+                for digest, path in self._entries.items()
+                if os.path.isdir(path)
+            ]
+
+    def evict(self, digest: Optional[str] = None) -> Optional[str]:
+        """
+        Removes single entry from the cache.
+
+        Args:
+            digest: Digest of the entry to remove (least recently used entry if not set).
+
+        Returns: Digest of the removed entry or `None` if cache is empty.
+        """
+
+        with self._lock:
+            if not self._entries:
+                return None
+            if digest is None:
+                digest = next(iter(self._entries))
+            path = self._entries.pop(digest, None)
+            if path is None:
+                return None
+            shutil.rmtree(path, ignore_errors=True)
+            return digest
+
+    def _evict(self):
+        while len(self._entries) > self._max_entries:
+            _, path = self._entries.popitem(last=False)
+            shutil.rmtree(path, ignore_errors=True)
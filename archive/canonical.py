@@ -0,0 +1,162 @@
+import hashlib
+import os
+import tarfile
+import tempfile
+from typing import BinaryIO, Dict, Iterator, Optional, Tuple
+
+from archive.manifest import ArchiveManifest, ManifestEntry
+from archive.stream import TarMember
+
+
+class CanonicalTar:
+    """
+    Rewrites tar stream into canonical form so identical trees produce byte-identical archives.
+
+    Members are sorted by name, ownership and modification times are normalized and regular
+    files with identical content are collapsed into hard links to the first of them. Source
+    stream is read only once, file contents are spooled to disk keyed by their SHA-256 digest.
+
+    Usage:
+        with CanonicalTar(source) as canonical:
+            write_xz_archive(canonical.members(), archive_path)
+    """
+
+    def __init__(
+        self,
+        source: Iterator[TarMember],
+        spool_dir: Optional[str] = None,
+        mtime: int = 0,
+    ):
+        """
+        Args:
+            source: Tar members in source order (i.e. from `iter_tar_members`).
+            spool_dir: Directory where temporary content store is created (system temp dir if not set).
+            mtime: Modification time set to all members.
+        """
+
+        self._source = source
+        self._spool_dir = spool_dir
+        self._mtime = mtime
+        self._store = None
+        self._members: Dict[str, tarfile.TarInfo] = {}
+        self._digests: Dict[str, str] = {}
+        self.files = 0
+        """Number of regular files (including hard links) in the archive."""
+        self.deduplicated = 0
+        """Number of regular files stored as hard links."""
+        self.deduplicated_bytes = 0
+        """Number of bytes saved by storing files as hard links."""
+
+    def __enter__(self) -> "CanonicalTar":
+        self._store = tempfile.TemporaryDirectory(
+            prefix="canonical-tar-", dir=self._spool_dir
+        )
+        self._spool()
+        return self
+
+    def __exit__(self, *_):
+        self._store.cleanup()
+        self._store = None
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self._store.name, digest)
+
+    def _spool(self):
+        """Reads source members and stores file contents in content addressable store."""
+
+        for member, data in self._source:
+            name = member.name.rstrip("/")
+            if member.islnk():
+                # Existing hard links are resolved to target content and linked again canonically
+                self._digests[name] = self._digests[member.linkname.rstrip("/")]
+            elif member.isreg():
+                self._digests[name] = self._store_blob(data)
+            self._members[name] = member
+
+    def _store_blob(self, data: Optional[BinaryIO]) -> str:
+        digest = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=self._store.name)
+        with os.fdopen(fd, "wb") as blob:
+            if data is not None:
+                for chunk in iter(lambda: data.read(1024 * 1024), b""):
+                    digest.update(chunk)
+                    blob.write(chunk)
+
+        blob_path = self._blob_path(digest.hexdigest())
+        if os.path.exists(blob_path):
+            os.remove(temp_path)
+        else:
+            os.rename(temp_path, blob_path)
+        return digest.hexdigest()
+
+    def _normalize(self, name: str, member: tarfile.TarInfo) -> tarfile.TarInfo:
+        canonical = tarfile.TarInfo(name)
+        canonical.type = (
+            tarfile.REGTYPE if member.type == tarfile.AREGTYPE else member.type
+        )
+        canonical.mode = member.mode
+        canonical.linkname = member.linkname if member.issym() else ""
+        canonical.devmajor, canonical.devminor = member.devmajor, member.devminor
+        canonical.mtime = self._mtime
+        canonical.uid = canonical.gid = 0
+        canonical.uname = canonical.gname = ""
+        return canonical
+
+    def members(self) -> Iterator[TarMember]:
+        """
+        Iterates members in canonical order.
+
+        Returns: Iterator over members, data of each member is valid only until next one is requested.
+        """
+
+        # Hard links share permissions, so only files with the same mode are collapsed
+        first_by_content: Dict[Tuple[str, int], str] = {}
+        for name in sorted(self._members):
+            member = self._normalize(name, self._members[name])
+
+            if name not in self._digests:
+                yield member, None
+                continue
+
+            self.files += 1
+            digest = self._digests[name]
+            blob_path = self._blob_path(digest)
+            if (digest, member.mode) in first_by_content:
+                member.type = tarfile.LNKTYPE
+                member.linkname = first_by_content[(digest, member.mode)]
+                self.deduplicated += 1
+                self.deduplicated_bytes += os.path.getsize(blob_path)
+                yield member, None
+                continue
+
+            first_by_content[(digest, member.mode)] = name
+            member.type = tarfile.REGTYPE
+            member.size = os.path.getsize(blob_path)
+            with open(blob_path, "rb") as data:
+                yield member, data
+
+    def manifest(self, archive_name: str) -> ArchiveManifest:
+        """
+        Lists all members in canonical order together with digests of their content.
+
+        Args:
+            archive_name: Name of the archive stored in manifest.
+
+        Returns: Archive manifest.
+        """
+
+        entries = []
+        for name in sorted(self._members):
+            member = self._members[name]
+            entry = ManifestEntry(name=name, type="other", mode=member.mode)
+            if name in self._digests:
+                entry.type = "file"
+                entry.sha256 = self._digests[name]
+                entry.size = os.path.getsize(self._blob_path(entry.sha256))
+            elif member.isdir():
+                entry.type = "dir"
+            elif member.issym():
+                entry.type = "symlink"
+                entry.linkname = member.linkname
+            entries.append(entry)
+        return ArchiveManifest(archive=archive_name, entries=entries)
@@ -0,0 +1,249 @@
+import fnmatch
+import hashlib
+import io
+import json
+import lzma
+import os
+import tarfile
+from typing import Dict, List, Set, Tuple
+
+from pydantic import BaseModel, Field
+
+from archive.paths import get_sidecar_path
+
+
+class ArchiveComponent(BaseModel):
+    """Named part of the toolchain tree that is published as a separate archive."""
+
+    name: str = Field(..., description="Name of the component.")
+
+    description: str = Field(default="", description="Short component description.")
+
+    patterns: List[str] = Field(
+        ...,
+        description="Glob patterns of paths (relative to toolchain root) that belong to the component.",
+    )
+
+
+class ComponentsManifest(BaseModel):
+    """Describes how the toolchain tree is split into components (first matching component wins)."""
+
+    components: List[ArchiveComponent] = Field(
+        ..., description="Ordered list of components."
+    )
+
+    @classmethod
+    def load(cls, path: str) -> "ComponentsManifest":
+        """Loads components manifest from JSON file."""
+        with open(path, "r") as manifest_file:
+            return cls.model_validate(json.load(manifest_file))
+
+    def component_of(self, relpath: str) -> str:
+        """
+        Finds component for the given path.
+
+        Args:
+            relpath: Path relative to toolchain root directory.
+
+        Returns: Name of the first component with a pattern matching the path.
+        """
+
+        for component in self.components:
+            if any(
+                fnmatch.fnmatchcase(relpath, pattern) for pattern in component.patterns
+            ):
+                return component.name
+        raise ValueError(f"Path '{relpath}' does not match any component!")
+
+
+class ComponentArchive(BaseModel):
+    """Published component archive as listed in the components index."""
+
+    name: str = Field(..., description="Name of the component.")
+
+    archive: str = Field(..., description="Name of the component archive asset.")
+
+    files: int = Field(..., description="Number of files in the component.")
+
+    size: int = Field(..., description="Size of the compressed archive in bytes.")
+
+    sha256: str = Field(..., description="SHA-256 digest of the compressed archive.")
+
+
+class ComponentsIndex(BaseModel):
+    """Index asset listing all component archives of a toolchain archive."""
+
+    archive: str = Field(..., description="Name of the full toolchain archive asset.")
+
+    components: List[ComponentArchive] = Field(
+        ..., description="Component archives which together form the full archive."
+    )
+
+
+def _relpath(member: tarfile.TarInfo) -> str:
+    """Gets member path relative to the archive root directory."""
+    _, _, relpath = member.name.partition("/")
+    return relpath
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class _ComponentWriter:
+    """Writes members of a single component, adding parent directories on demand."""
+
+    def __init__(self, path: str, directories: Dict[str, tarfile.TarInfo]):
+        self.path = path
+        self.files = 0
+        self._directories = directories
+        self._written: Set[str] = set()
+        self._xz_file = lzma.open(path, "wb")
+        self._tar = tarfile.open(
+            fileobj=self._xz_file, mode="w", format=tarfile.PAX_FORMAT
+        )
+
+    def _add_parents(self, name: str):
+        parts = name.split("/")[:-1]
+        for index in range(1, len(parts) + 1):
+            parent = "/".join(parts[:index])
+            if parent not in self._written and parent in self._directories:
+                self._tar.addfile(self._directories[parent])
+                self._written.add(parent)
+
+    def add(self, member: tarfile.TarInfo, fileobj=None):
+        if member.name in self._written:
+            return
+        self._add_parents(member.name)
+        self._tar.addfile(member, fileobj)
+        self._written.add(member.name)
+        if not member.isdir():
+            self.files += 1
+
+    def close(self):
+        self._tar.close()
+        self._xz_file.close()
+
+
+def split_archive(
+    archive_path: str, manifest: ComponentsManifest
+) -> Tuple[List[str], str]:
+    """
+    Splits toolchain archive into component archives described by the manifest.
+
+    Hard links pointing to a file in another component are stored as regular files,
+    so every component archive can be extracted on its own.
+
+    Args:
+        archive_path: Path to the full toolchain archive (.tar.xz).
+        manifest: Manifest describing the components.
+
+    Returns: Paths of the component archives and path of the components index.
+    """
+
+    # First pass: assign members to components and find hard links crossing components
+    components: Dict[str, str] = {}
+    cross_links: Dict[str, List[tarfile.TarInfo]] = {}
+    # Archive is read through lzma module which (unlike tarfile stream mode) decodes
+    # archives made of multiple concatenated xz streams (i.e. seekable archives)
+    with (
+        lzma.open(archive_path, "rb") as xz_file,
+        tarfile.open(fileobj=xz_file, mode="r|") as tar,
+    ):
+        for member in tar:
+            relpath = _relpath(member)
+            components[member.name] = manifest.component_of(relpath) if relpath else ""
+            if (
+                member.islnk()
+                and components.get(member.linkname) != components[member.name]
+            ):
+                cross_links.setdefault(member.linkname, []).append(member)
+
+    # Second pass: write members to component archives
+    directories: Dict[str, tarfile.TarInfo] = {}
+    writers = {
+        component.name: _ComponentWriter(
+            get_sidecar_path(archive_path, f"-{component.name}.tar.xz"), directories
+        )
+        for component in manifest.components
+    }
+    materialized: Dict[Tuple[str, str], str] = {}
+    try:
+        with (
+            lzma.open(archive_path, "rb") as xz_file,
+            tarfile.open(fileobj=xz_file, mode="r|") as tar,
+        ):
+            for member in tar:
+                component = components[member.name]
+                if member.isdir():
+                    directories[member.name] = member
+                    if component:
+                        writers[component].add(member)
+                    continue
+
+                if member.islnk():
+                    target = materialized.get((member.linkname, component))
+                    if target is None:
+                        writers[component].add(member)
+                    elif target != member.name:
+                        link = tarfile.TarInfo(member.name)
+                        link.type = tarfile.LNKTYPE
+                        link.linkname = target
+                        link.mode, link.mtime = member.mode, member.mtime
+                        link.uid, link.gid = member.uid, member.gid
+                        writers[component].add(link)
+                    continue
+
+                if not member.isreg():
+                    writers[component].add(member)
+                    continue
+
+                # Regular file - stream data into own component and into any other
+                # component containing hard links to this file
+                targets = [(component, member)]
+                for link in cross_links.get(member.name, []):
+                    link_component = components[link.name]
+                    if (member.name, link_component) in materialized:
+                        continue
+                    copy = member.replace(name=link.name, deep=False)
+                    targets.append((link_component, copy))
+                    materialized[(member.name, link_component)] = link.name
+
+                data = tar.extractfile(member)
+                if len(targets) == 1:
+                    writers[component].add(member, data)
+                    continue
+                content = data.read() if data else b""
+                for target_component, target_member in targets:
+                    writers[target_component].add(target_member, io.BytesIO(content))
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    # Drop empty components and write index
+    archives = []
+    index = ComponentsIndex(archive=os.path.basename(archive_path), components=[])
+    for name, writer in writers.items():
+        if writer.files == 0:
+            os.remove(writer.path)
+            continue
+        archives.append(writer.path)
+        index.components.append(
+            ComponentArchive(
+                name=name,
+                archive=os.path.basename(writer.path),
+                files=writer.files,
+                size=os.path.getsize(writer.path),
+                sha256=_sha256(writer.path),
+            )
+        )
+
+    index_path = get_sidecar_path(archive_path, ".components.json")
+    with open(index_path, "w") as index_file:
+        index_file.write(index.model_dump_json(indent=2))
+
+    return archives, index_path
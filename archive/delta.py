@@ -0,0 +1,572 @@
+import hashlib
+import io
+import lzma
+import os
+import tarfile
+import tempfile
+from typing import BinaryIO, Dict, Iterator, List, Optional, Set, Tuple
+
+from pydantic import BaseModel, Field
+
+from archive.canonical import CanonicalTar
+from archive.manifest import ManifestEntry
+from archive.stream import TarMember
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+"""Average size of content-defined chunks compared between changed files of base and target archives."""
+
+DEFAULT_MIN_PATCH_SIZE = 1024 * 1024
+"""Changed files smaller than this are stored in delta as a whole."""
+
+_INDEX_NAME = "delta.json"
+_CHUNKS_DIR = "chunks"
+
+# Random values of bytes for gear rolling hash, boundaries depend only on the last 30 bytes
+_GEAR = [
+    int.from_bytes(hashlib.sha256(bytes([value])).digest()[:4], "little") & 0x3FFFFFFF
+    for value in range(256)
+]
+
+
+class DeltaChunk(BaseModel):
+    """Consecutive part of a target file, either copied from base archive or stored in delta."""
+
+    size: int = Field(..., description="Size of the chunk.")
+
+    sha256: Optional[str] = Field(
+        default=None, description="Digest of the chunk stored in delta."
+    )
+
+    base_sha256: Optional[str] = Field(
+        default=None, description="Digest of the base file the chunk is copied from."
+    )
+
+    base_offset: int = Field(
+        default=0, description="Offset of the chunk in the base file."
+    )
+
+
+class DeltaIndex(BaseModel):
+    """Describes how to rebuild target archive from base archive and delta chunks."""
+
+    base_archive: str = Field(..., description="Name of the base archive.")
+
+    base_tar_sha256: str = Field(
+        ..., description="Digest of the uncompressed base tar."
+    )
+
+    target_archive: str = Field(..., description="Name of the target archive.")
+
+    tar_sha256: str = Field(..., description="Digest of the uncompressed target tar.")
+
+    added: List[str] = Field(
+        default=[],
+        description="Paths (relative to root directory) missing in base archive.",
+    )
+
+    removed: List[str] = Field(
+        default=[],
+        description="Paths (relative to root directory) missing in target archive.",
+    )
+
+    changed: List[str] = Field(
+        default=[],
+        description="Paths (relative to root directory) present in both archives with different entry.",
+    )
+
+    entries: List[ManifestEntry] = Field(
+        ..., description="Members of the target archive in canonical order."
+    )
+
+    files: Dict[str, List[DeltaChunk]] = Field(
+        ..., description="Chunks of target file content keyed by its digest."
+    )
+
+
+class DeltaStats(BaseModel):
+    """Statistics of a created delta."""
+
+    unchanged: int = Field(default=0, description="Number of unchanged entries.")
+
+    added: int = Field(default=0, description="Number of added entries.")
+
+    removed: int = Field(default=0, description="Number of removed entries.")
+
+    changed: int = Field(default=0, description="Number of changed entries.")
+
+    copied_bytes: int = Field(
+        default=0, description="File data copied from base archive."
+    )
+
+    stored_bytes: int = Field(default=0, description="File data stored in delta.")
+
+
+class _HashingReader:
+    """File object computing digest of everything read from the wrapped file."""
+
+    def __init__(self, source: BinaryIO):
+        self._source = source
+        self.digest = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._source.read(size)
+        self.digest.update(data)
+        return data
+
+    def drain(self) -> str:
+        """Reads the rest of the file (i.e. tar padding) and returns final digest."""
+        for _ in iter(lambda: self.read(1024 * 1024), b""):
+            pass
+        return self.digest.hexdigest()
+
+
+class _HashingWriter:
+    """File object computing digest of everything written to the wrapped file."""
+
+    def __init__(self, output: BinaryIO):
+        self._output = output
+        self.digest = hashlib.sha256()
+        self.position = 0
+
+    def tell(self) -> int:
+        return self.position
+
+    def write(self, data: bytes) -> int:
+        self.digest.update(data)
+        self.position += len(data)
+        return self._output.write(data)
+
+
+def _iter_archive(
+    archive_path: str,
+) -> Iterator[Tuple[tarfile.TarInfo, Optional[BinaryIO], Optional[str]]]:
+    """Iterates members of .tar.xz archive, last item yields digest of the uncompressed tar as a third element."""
+
+    with lzma.open(archive_path, "rb") as xz_file:
+        reader = _HashingReader(xz_file)
+        with tarfile.open(fileobj=reader, mode="r|") as tar:
+            for member in tar:
+                yield member, tar.extractfile(member) if member.isreg() else None, None
+            yield None, None, reader.drain()
+
+
+def _relative_path(name: str) -> str:
+    return name.partition("/")[2]
+
+
+def _manifest_entry(member: tarfile.TarInfo, digest: Optional[str], size: int):
+    name = member.name.rstrip("/")
+    if digest is not None:
+        return ManifestEntry(
+            name=name, type="file", mode=member.mode, size=size, sha256=digest
+        )
+    if member.isdir():
+        return ManifestEntry(name=name, type="dir", mode=member.mode)
+    if member.issym():
+        return ManifestEntry(
+            name=name, type="symlink", mode=member.mode, linkname=member.linkname
+        )
+    raise RuntimeError(f"Member '{name}' of type {member.type} is not supported!")
+
+
+def _iter_chunks(data: BinaryIO, chunk_size: int) -> Iterator[bytes]:
+    """
+    Splits file into content-defined chunks of `chunk_size` bytes on average.
+
+    Boundaries are placed where gear rolling hash of preceding bytes has all masked bits zero,
+    so inserted or removed data shifts only boundaries around the edit and remaining chunks
+    match at any offset. Chunks are at least half and at most four times of `chunk_size`.
+    """
+
+    min_size, max_size = chunk_size // 2, chunk_size * 4
+    bits = max(chunk_size.bit_length() - 2, 1)
+    mask = ((1 << bits) - 1) << (30 - bits)
+    gear = _GEAR
+    buffer = b""
+    eof = False
+    while True:
+        while not eof and len(buffer) < max_size:
+            content = data.read(max_size)
+            eof = not content
+            buffer += content
+        if not buffer:
+            return
+
+        # Hash depends only on the last 30 bytes, so hashing starts right before the minimal size
+        cut = min(len(buffer), max_size)
+        if cut > min_size:
+            start = max(min_size - 32, 0)
+            value = 0
+            for offset, byte in enumerate(buffer[start:cut], start + 1):
+                value = ((value << 1) + gear[byte]) & 0x3FFFFFFF
+                if not value & mask and offset >= min_size:
+                    cut = offset
+                    break
+        yield buffer[:cut]
+        buffer = buffer[cut:]
+
+
+def _digest_files(archive_path: str) -> Set[str]:
+    """Lists digests of all files in archive."""
+
+    files: Set[str] = set()
+    for member, data, _ in _iter_archive(archive_path):
+        if member is not None and member.isreg():
+            file_digest = hashlib.sha256()
+            for chunk in iter(lambda: data.read(1024 * 1024), b""):
+                file_digest.update(chunk)
+            files.add(file_digest.hexdigest())
+    return files
+
+
+def _index_base(
+    base_archive_path: str,
+    chunk_size: int,
+    min_patch_size: int,
+    target_files: Set[str],
+    spool_dir: Optional[str],
+) -> Tuple[Dict[str, ManifestEntry], Set[str], Dict[str, Tuple[str, int]], str]:
+    """
+    Lists base entries, digests of base files and chunk locations (digest -> base file, offset).
+
+    Only files of at least `min_patch_size` bytes missing in the target archive are split into chunks,
+    as the rest is either copied as a whole or too small to be patched.
+    """
+
+    entries: Dict[str, ManifestEntry] = {}
+    files: Set[str] = set()
+    chunks: Dict[str, Tuple[str, int]] = {}
+    tar_sha256 = ""
+    for member, data, tar_digest in _iter_archive(base_archive_path):
+        if member is None:
+            tar_sha256 = tar_digest
+            continue
+
+        digest = None
+        if member.islnk():
+            digest = entries[member.linkname.rstrip("/")].sha256
+        elif member.isreg():
+            with tempfile.TemporaryFile(dir=spool_dir) as spool:
+                file_digest = hashlib.sha256()
+                for chunk in iter(lambda: data.read(1024 * 1024), b""):
+                    file_digest.update(chunk)
+                    spool.write(chunk)
+                digest = file_digest.hexdigest()
+
+                if (
+                    digest not in files
+                    and digest not in target_files
+                    and member.size >= min_patch_size
+                ):
+                    spool.seek(0)
+                    offset = 0
+                    for chunk in _iter_chunks(spool, chunk_size):
+                        chunks.setdefault(
+                            hashlib.sha256(chunk).hexdigest(), (digest, offset)
+                        )
+                        offset += len(chunk)
+            files.add(digest)
+        entry = _manifest_entry(member, digest, member.size)
+        if member.islnk():
+            entry.size = entries[member.linkname.rstrip("/")].size
+        entries[entry.name] = entry
+    return entries, files, chunks, tar_sha256
+
+
+def create_delta(
+    base_archive_path: str,
+    archive_path: str,
+    delta_path: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    min_patch_size: int = DEFAULT_MIN_PATCH_SIZE,
+    spool_dir: Optional[str] = None,
+) -> DeltaStats:
+    """
+    Creates delta rebuilding canonical target archive from base archive.
+
+    Delta is an xz compressed tar with chunks missing in the base archive followed by `delta.json` index.
+    Index contains per-file diff of both archives, full list of target members and chunk lists of
+    target files. Files present in base archive (under any path) are copied as a whole, changed files
+    of at least `min_patch_size` bytes are split into content-defined chunks and only chunks missing
+    in large changed files of base archive are stored, remaining files are stored as a whole.
+
+    Args:
+        base_archive_path: Path to the base archive (.tar.xz).
+        archive_path: Path to the target archive (.tar.xz written from `CanonicalTar`).
+        delta_path: Path where to store the delta.
+        chunk_size: Average size of compared chunks.
+        min_patch_size: Minimal size of changed file split into chunks.
+        spool_dir: Directory where large files are spooled (system temp dir if not set).
+
+    Returns: Delta statistics.
+    """
+
+    base_entries, base_files, base_chunks, base_tar_sha256 = _index_base(
+        base_archive_path,
+        chunk_size,
+        min_patch_size,
+        _digest_files(archive_path),
+        spool_dir,
+    )
+
+    stats = DeltaStats()
+    entries: Dict[str, ManifestEntry] = {}
+    files: Dict[str, List[DeltaChunk]] = {}
+    stored: Set[str] = set()
+    tar_sha256 = ""
+
+    with lzma.open(delta_path, "wb") as xz_file:
+        with tarfile.open(
+            fileobj=xz_file, mode="w", format=tarfile.PAX_FORMAT
+        ) as delta_tar:
+
+            def store_chunk(chunk: bytes, digest: str) -> DeltaChunk:
+                if digest not in stored:
+                    info = tarfile.TarInfo(f"{_CHUNKS_DIR}/{digest}")
+                    info.size = len(chunk)
+                    delta_tar.addfile(info, io.BytesIO(chunk))
+                    stored.add(digest)
+                    stats.stored_bytes += len(chunk)
+                return DeltaChunk(size=len(chunk), sha256=digest)
+
+            def patch_file(spool: BinaryIO) -> List[DeltaChunk]:
+                chunks = []
+                spool.seek(0)
+                for chunk in _iter_chunks(spool, chunk_size):
+                    digest = hashlib.sha256(chunk).hexdigest()
+                    if digest in base_chunks:
+                        base_digest, base_offset = base_chunks[digest]
+                        chunks.append(
+                            DeltaChunk(
+                                size=len(chunk),
+                                base_sha256=base_digest,
+                                base_offset=base_offset,
+                            )
+                        )
+                        stats.copied_bytes += len(chunk)
+                    else:
+                        chunks.append(store_chunk(chunk, digest))
+                return chunks
+
+            for member, data, tar_digest in _iter_archive(archive_path):
+                if member is None:
+                    tar_sha256 = tar_digest
+                    continue
+
+                digest = None
+                size = member.size
+                if member.islnk():
+                    target = entries[member.linkname.rstrip("/")]
+                    digest, size = target.sha256, target.size
+                elif member.isreg():
+                    with tempfile.TemporaryFile(dir=spool_dir) as spool:
+                        file_digest = hashlib.sha256()
+                        for chunk in iter(lambda: data.read(1024 * 1024), b""):
+                            file_digest.update(chunk)
+                            spool.write(chunk)
+                        digest = file_digest.hexdigest()
+
+                        if digest in files:
+                            pass
+                        elif digest in base_files:
+                            files[digest] = [DeltaChunk(size=size, base_sha256=digest)]
+                            stats.copied_bytes += size
+                        elif size >= min_patch_size:
+                            files[digest] = patch_file(spool)
+                        else:
+                            spool.seek(0)
+                            files[digest] = [store_chunk(spool.read(), digest)]
+
+                entry = _manifest_entry(member, digest, size)
+                entries[entry.name] = entry
+
+            # Per-file diff of both archives, root directory differs between versions
+            base_by_path = {
+                _relative_path(name): entry for name, entry in base_entries.items()
+            }
+            by_path = {_relative_path(name): entry for name, entry in entries.items()}
+            added = [path for path in by_path if path not in base_by_path]
+            removed = [path for path in base_by_path if path not in by_path]
+            changed = [
+                path
+                for path, entry in by_path.items()
+                if path in base_by_path
+                and entry.model_dump(exclude={"name"})
+                != base_by_path[path].model_dump(exclude={"name"})
+            ]
+            stats.added, stats.removed, stats.changed = (
+                len(added),
+                len(removed),
+                len(changed),
+            )
+            stats.unchanged = len(by_path) - stats.added - stats.changed
+
+            index = DeltaIndex(
+                base_archive=os.path.basename(base_archive_path),
+                base_tar_sha256=base_tar_sha256,
+                target_archive=os.path.basename(archive_path),
+                tar_sha256=tar_sha256,
+                added=added,
+                removed=removed,
+                changed=changed,
+                entries=list(entries.values()),
+                files=files,
+            )
+            index_data = index.model_dump_json().encode()
+            info = tarfile.TarInfo(_INDEX_NAME)
+            info.size = len(index_data)
+            delta_tar.addfile(info, io.BytesIO(index_data))
+
+    return stats
+
+
+def _spool_file(data: BinaryIO, store: str) -> Tuple[str, str]:
+    """Copies file data into the store, returns its temporary path and digest."""
+
+    digest = hashlib.sha256()
+    fd, path = tempfile.mkstemp(dir=store)
+    with os.fdopen(fd, "wb") as output:
+        for chunk in iter(lambda: data.read(1024 * 1024), b""):
+            digest.update(chunk)
+            output.write(chunk)
+    return path, digest.hexdigest()
+
+
+def apply_delta(
+    base_archive_path: str,
+    delta_path: str,
+    archive_path: str,
+    spool_dir: Optional[str] = None,
+) -> str:
+    """
+    Rebuilds target archive from base archive and delta.
+
+    Rebuilt archive contains byte-identical tar as the target archive (compression framing
+    may differ), which is verified by comparing digest of the uncompressed tar with the one
+    recorded in delta.
+
+    Args:
+        base_archive_path: Path to the base archive delta was created against.
+        delta_path: Path to the delta (.delta).
+        archive_path: Path where to store rebuilt archive (.tar.xz).
+        spool_dir: Directory where temporary content store is created (system temp dir if not set).
+
+    Returns: Digest of the uncompressed tar of rebuilt archive.
+    """
+
+    with tempfile.TemporaryDirectory(prefix="archive-delta-", dir=spool_dir) as store:
+        chunks_dir = os.path.join(store, _CHUNKS_DIR)
+        os.makedirs(chunks_dir)
+
+        # Stored chunks precede the index
+        index: Optional[DeltaIndex] = None
+        with lzma.open(delta_path, "rb") as xz_file:
+            with tarfile.open(fileobj=xz_file, mode="r|") as delta_tar:
+                for member in delta_tar:
+                    data = delta_tar.extractfile(member)
+                    if member.name == _INDEX_NAME:
+                        index = DeltaIndex.model_validate_json(data.read())
+                    elif member.isreg():
+                        path, digest = _spool_file(data, chunks_dir)
+                        if f"{_CHUNKS_DIR}/{digest}" != member.name:
+                            raise RuntimeError(
+                                f"Chunk '{member.name}' of delta '{delta_path}' is corrupted!"
+                            )
+                        os.rename(path, os.path.join(chunks_dir, digest))
+        if index is None:
+            raise RuntimeError(f"Delta '{delta_path}' does not contain index!")
+
+        # Only base files referenced by delta are spooled
+        base_dir = os.path.join(store, "base")
+        os.makedirs(base_dir)
+        required = {
+            chunk.base_sha256
+            for chunks in index.files.values()
+            for chunk in chunks
+            if chunk.base_sha256 is not None
+        }
+        for member, data, tar_digest in _iter_archive(base_archive_path):
+            if member is None:
+                if tar_digest != index.base_tar_sha256:
+                    raise RuntimeError(
+                        f"Archive '{base_archive_path}' is not the base of delta '{delta_path}' (expected {index.base_archive})!"
+                    )
+            elif member.isreg():
+                path, digest = _spool_file(data, base_dir)
+                if digest in required:
+                    os.rename(path, os.path.join(base_dir, digest))
+                else:
+                    os.remove(path)
+
+        files_dir = os.path.join(store, "files")
+        os.makedirs(files_dir)
+
+        def assemble(entry: ManifestEntry) -> str:
+            path = os.path.join(files_dir, entry.sha256)
+            if os.path.exists(path):
+                return path
+
+            digest = hashlib.sha256()
+            with open(path, "wb") as output:
+                for chunk in index.files[entry.sha256]:
+                    if chunk.sha256 is not None:
+                        source_path = os.path.join(chunks_dir, chunk.sha256)
+                    else:
+                        source_path = os.path.join(base_dir, chunk.base_sha256)
+
+                    # Whole base files can be hundreds of MB, so they are copied in bounded pieces
+                    with open(source_path, "rb") as data:
+                        data.seek(chunk.base_offset if chunk.sha256 is None else 0)
+                        remaining = chunk.size
+                        while remaining > 0:
+                            content = data.read(min(remaining, 1024 * 1024))
+                            if not content:
+                                break
+                            digest.update(content)
+                            output.write(content)
+                            remaining -= len(content)
+            if digest.hexdigest() != entry.sha256:
+                raise RuntimeError(
+                    f"File '{entry.name}' rebuilt from delta '{delta_path}' does not match its digest!"
+                )
+            return path
+
+        def members() -> Iterator[TarMember]:
+            for entry in index.entries:
+                info = tarfile.TarInfo(entry.name)
+                info.mode = entry.mode
+                if entry.type == "file":
+                    info.type = tarfile.REGTYPE
+                    info.size = entry.size
+                    with open(assemble(entry), "rb") as data:
+                        yield info, data
+                    continue
+
+                if entry.type == "dir":
+                    info.type = tarfile.DIRTYPE
+                elif entry.type == "symlink":
+                    info.type = tarfile.SYMTYPE
+                    info.linkname = entry.linkname
+                else:
+                    raise RuntimeError(
+                        f"Member '{entry.name}' of type {entry.type} is not supported!"
+                    )
+                yield info, None
+
+        # Members are collapsed into hard links the same way as when target archive was created
+        with CanonicalTar(members(), spool_dir=store) as canonical:
+            with lzma.open(archive_path, "wb") as xz_file:
+                writer = _HashingWriter(xz_file)
+                with tarfile.open(
+                    fileobj=writer, mode="w", format=tarfile.PAX_FORMAT
+                ) as tar:
+                    for member, data in canonical.members():
+                        tar.addfile(member, data)
+
+    tar_sha256 = writer.digest.hexdigest()
+    if tar_sha256 != index.tar_sha256:
+        os.remove(archive_path)
+        raise RuntimeError(
+            f"Archive rebuilt from delta '{delta_path}' does not match {index.target_archive}!"
+        )
+    return tar_sha256
@@ -0,0 +1,210 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+import lzma
+import os
+import tarfile
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from pydantic import BaseModel, Field
+
+
+class ExtractionStats(BaseModel):
+    """Statistics of a single archive extraction."""
+
+    files: int = Field(default=0, description="Number of extracted regular files.")
+
+    directories: int = Field(default=0, description="Number of created directories.")
+
+    links: int = Field(
+        default=0, description="Number of created symbolic and hard links."
+    )
+
+    bytes: int = Field(default=0, description="Total size of extracted file data.")
+
+    seconds: float = Field(default=0.0, description="Duration of the extraction.")
+
+    @property
+    def files_per_second(self) -> float:
+        """Gets extraction throughput in files per second."""
+        return self.files / self.seconds if self.seconds > 0 else 0.0
+
+
+class _PendingBytes:
+    """Bounds amount of file data read from the archive but not yet written to disk."""
+
+    def __init__(self, limit: int):
+        self._limit = limit
+        self._pending = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, size: int):
+        with self._condition:
+            # Single file larger than the limit is let through once nothing else is pending
+            self._condition.wait_for(
+                lambda: self._pending == 0 or self._pending + size <= self._limit
+            )
+            self._pending += size
+
+    def release(self, size: int):
+        with self._condition:
+            self._pending -= size
+            self._condition.notify_all()
+
+
+def _write_files(batch: List[Tuple[str, bytes]], pending: _PendingBytes):
+    try:
+        for path, data in batch:
+            with open(path, "wb") as output:
+                output.write(data)
+    finally:
+        pending.release(sum(len(data) for _, data in batch))
+
+
+def _check_parents(member: tarfile.TarInfo, output_dir: str, symlinks: Dict[str, str]):
+    """Rejects member extracted through a symbolic link of the archive (links are created last)."""
+
+    name = os.path.normpath(member.name)
+    parent = os.path.dirname(name)
+    while parent:
+        if parent in symlinks:
+            path = os.path.join(symlinks[parent], os.path.relpath(name, parent))
+            if os.path.commonpath([path, output_dir]) != output_dir:
+                raise tarfile.OutsideDestinationError(member, path)
+            raise tarfile.FilterError(
+                f"{member.name!r} would be extracted through symbolic link {parent!r}"
+            )
+        parent = os.path.dirname(parent)
+
+
+def extract_archive(
+    archive_path: str,
+    output_dir: str,
+    workers: Optional[int] = None,
+    max_pending_bytes: int = 256 * 1024 * 1024,
+    batch_size: int = 64,
+) -> ExtractionStats:
+    """
+    Extracts .tar.xz archive by decompressing on the calling thread and writing files on a thread pool.
+
+    Members are checked by tarfile's `tar` extraction filter, members under a symbolic link of
+    the archive and duplicate members are rejected. Directories are created upfront,
+    links are created after all files are written and permissions and modification times are
+    applied in a final pass (directories deepest first).
+
+    Args:
+        archive_path: Path to the archive (.tar.xz).
+        output_dir: Directory where archive is extracted.
+        workers: Number of threads creating files (twice the number of CPUs if not set).
+        max_pending_bytes: Maximum amount of decompressed data submitted but not yet written
+            (on top of a single batch being collected).
+        batch_size: Maximum number of small files written by a single pool task.
+
+    Returns: Extraction statistics.
+    """
+
+    start = time.monotonic()
+    stats = ExtractionStats()
+    output_dir = os.path.abspath(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+
+    pending = _PendingBytes(max_pending_bytes)
+    directories: Set[str] = {output_dir}
+    names: Set[str] = set()
+    symlinks: Dict[str, str] = {}
+    links: List[tarfile.TarInfo] = []
+    metadata: List[Tuple[str, tarfile.TarInfo]] = []
+    directory_metadata: List[Tuple[str, tarfile.TarInfo]] = []
+    writes: List[Future] = []
+    batch: List[Tuple[str, bytes]] = []
+    batch_bytes = 0
+
+    def make_dirs(path: str):
+        if path not in directories:
+            os.makedirs(path, exist_ok=True)
+            directories.add(path)
+
+    def submit_batch():
+        nonlocal batch, batch_bytes
+        if batch:
+            # Only submitted bytes are counted, so the wait never depends on this thread
+            pending.acquire(batch_bytes)
+            writes.append(pool.submit(_write_files, batch, pending))
+            batch, batch_bytes = [], 0
+
+    with ThreadPoolExecutor(max_workers=workers or 2 * (os.cpu_count() or 1)) as pool:
+        try:
+            with lzma.open(archive_path, "rb") as xz_file:
+                with tarfile.open(fileobj=xz_file, mode="r|") as tar:
+                    for member in tar:
+                        member = tarfile.tar_filter(member, output_dir)
+                        path = os.path.join(output_dir, member.name)
+
+                        # Files are written concurrently, so later duplicate would not reliably win
+                        name = os.path.normpath(member.name)
+                        if name in names:
+                            raise tarfile.FilterError(
+                                f"{member.name!r} is duplicate member of the archive"
+                            )
+                        names.add(name)
+                        _check_parents(member, output_dir, symlinks)
+                        if member.issym():
+                            symlinks[name] = os.path.normpath(
+                                os.path.join(os.path.dirname(path), member.linkname)
+                            )
+
+                        if member.isdir():
+                            make_dirs(path.rstrip("/"))
+                            directory_metadata.append((path, member))
+                            stats.directories += 1
+                        elif member.isreg():
+                            make_dirs(os.path.dirname(path))
+                            data = tar.extractfile(member).read()
+                            batch.append((path, data))
+                            batch_bytes += len(data)
+                            if len(batch) >= batch_size or batch_bytes >= 1024 * 1024:
+                                submit_batch()
+                            metadata.append((path, member))
+                            stats.files += 1
+                            stats.bytes += len(data)
+                        elif member.issym() or member.islnk():
+                            make_dirs(os.path.dirname(path))
+                            links.append(member)
+                            stats.links += 1
+            submit_batch()
+        finally:
+            for write in writes:
+                write.result()
+
+    # Links are created once all files exist (hard link targets must be present)
+    for member in links:
+        path = os.path.join(output_dir, member.name)
+        if os.path.lexists(path) and not os.path.isdir(path):
+            os.unlink(path)
+        if member.issym():
+            os.symlink(member.linkname, path)
+        else:
+            os.link(os.path.join(output_dir, member.linkname), path)
+            metadata.append((path, member))
+
+    # Metadata is applied last, directories from the deepest so their mtime is not changed again
+    chown = hasattr(os, "geteuid") and os.geteuid() == 0
+    for path, member in metadata:
+        if chown:
+            os.chown(path, member.uid, member.gid)
+        if member.mode is not None:
+            os.chmod(path, member.mode)
+        if member.mtime is not None:
+            os.utime(path, (member.mtime, member.mtime))
+    for path, member in sorted(
+        directory_metadata, key=lambda item: item[0], reverse=True
+    ):
+        if chown:
+            os.chown(path, member.uid, member.gid)
+        if member.mode is not None:
+            os.chmod(path, member.mode)
+        if member.mtime is not None:
+            os.utime(path, (member.mtime, member.mtime))
+
+    stats.seconds = time.monotonic() - start
+    return stats
@@ -0,0 +1,43 @@
+import json
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+
+class ManifestEntry(BaseModel):
+    """Single member of the archive listed in the manifest."""
+
+    name: str = Field(..., description="Path of the member in archive.")
+
+    type: str = Field(
+        ..., description="Member type ('file', 'dir', 'symlink' or 'other')."
+    )
+
+    mode: int = Field(..., description="Permission bits of the member.")
+
+    size: int = Field(default=0, description="Size of the file content.")
+
+    sha256: Optional[str] = Field(
+        default=None, description="SHA-256 digest of the file content."
+    )
+
+    linkname: str = Field(default="", description="Target of symbolic link.")
+
+
+class ArchiveManifest(BaseModel):
+    """List of all members of the archive together with digests of their content."""
+
+    archive: str = Field(..., description="Name of the archive.")
+
+    entries: List[ManifestEntry] = Field(..., description="Members sorted by name.")
+
+    @classmethod
+    def load(cls, path: str) -> "ArchiveManifest":
+        """Loads manifest from JSON file."""
+        with open(path, "r") as manifest_file:
+            return cls.model_validate(json.load(manifest_file))
+
+    def save(self, path: str):
+        """Stores manifest to JSON file."""
+        with open(path, "w") as manifest_file:
+            manifest_file.write(self.model_dump_json(indent=1))
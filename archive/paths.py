@@ -16,6 +16,21 @@ def get_prefix_from_archive_path(archive_path: str) -> str:
     return prefix
 
 
+def get_sidecar_path(archive_path: str, suffix: str) -> str:
+    """
+    Calculates path of a file published next to the archive (i.e. index, manifest or component archive).
+
+    Args:
+        archive_path: Relative or absolute path to the archive (must have two file extension .tar.<anything>).
+        suffix: Suffix appended to the archive prefix (i.e. `.index.json`).
+
+    Returns: Path of the sidecar file in the archive directory.
+    """
+
+    prefix = get_prefix_from_archive_path(archive_path)
+    return os.path.join(os.path.dirname(archive_path), f"{prefix}{suffix}")
+
+
 def get_output_dir_from_archive_path(archive_path: str) -> str:
     """
     Calculates sysroot output directory based on archive path that will be used to store the output.
@@ -0,0 +1,90 @@
+import fnmatch
+import json
+import posixpath
+from typing import Dict, Iterator, List, Set
+
+from pydantic import BaseModel, Field
+
+from archive.stream import TarMember
+
+
+class PruneProfile(BaseModel):
+    """Describes which paths (relative to archive root directory) are kept in the archive."""
+
+    keep: List[str] = Field(..., description="Glob patterns of kept paths.")
+
+    drop: List[str] = Field(
+        default=[], description="Glob patterns of paths dropped even if kept."
+    )
+
+    @classmethod
+    def load(cls, path: str) -> "PruneProfile":
+        """Loads prune profile from JSON file."""
+        with open(path, "r") as profile_file:
+            return cls.model_validate(json.load(profile_file))
+
+    def keeps(self, relpath: str) -> bool:
+        """Verifies if path is kept by the profile."""
+
+        def matches(patterns: List[str]) -> bool:
+            return any(fnmatch.fnmatchcase(relpath, pattern) for pattern in patterns)
+
+        return matches(self.keep) and not matches(self.drop)
+
+
+def _symlink_target(relpath: str, linkname: str) -> str:
+    # Absolute links are resolved against the archive root (i.e. sysroot)
+    if linkname.startswith("/"):
+        return posixpath.normpath(linkname.lstrip("/"))
+    return posixpath.normpath(posixpath.join(posixpath.dirname(relpath), linkname))
+
+
+def prune_members(
+    members: Iterator[TarMember], profile: PruneProfile
+) -> Iterator[TarMember]:
+    """
+    Filters tar members in a single pass, keeping only paths selected by the profile.
+
+    Directories are emitted only once they contain a kept member, symbolic links are kept only
+    if both the link and its target are kept and hard links only if their target was kept.
+
+    Args:
+        members: Tar members in archive order (directories before their content).
+        profile: Prune profile.
+
+    Returns: Iterator over kept members.
+    """
+
+    pending_directories: Dict[str, TarMember] = {}
+    kept: Set[str] = set()
+
+    for member, data in members:
+        name = member.name.rstrip("/")
+        _, _, relpath = name.partition("/")
+
+        if member.isdir():
+            if relpath:
+                pending_directories[name] = (member, data)
+                continue
+            keep = True
+        elif member.islnk():
+            keep = member.linkname.rstrip("/") in kept
+        elif member.issym():
+            keep = profile.keeps(relpath) and profile.keeps(
+                _symlink_target(relpath, member.linkname)
+            )
+        else:
+            keep = profile.keeps(relpath)
+
+        if not keep:
+            continue
+
+        parts = name.split("/")
+        for index in range(1, len(parts)):
+            parent = "/".join(parts[:index])
+            if parent in pending_directories:
+                yield pending_directories.pop(parent)
+                kept.add(parent)
+
+        kept.add(name)
+        yield member, data
@@ -0,0 +1,297 @@
+import json
+import lzma
+import os
+import tarfile
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional
+
+from pydantic import BaseModel, Field
+
+from archive.paths import get_sidecar_path
+from archive.stream import TarMember
+
+DEFAULT_FRAME_SIZE = 4 * 1024 * 1024
+"""Uncompressed size after which new frame is started (frames are only split between tar members)."""
+
+
+class SeekableFrame(BaseModel):
+    """Independently compressed xz stream inside the seekable archive."""
+
+    compressed_offset: int = Field(..., description="Offset of the frame in archive.")
+
+    compressed_size: int = Field(..., description="Compressed size of the frame.")
+
+    uncompressed_offset: int = Field(
+        ..., description="Offset of the frame in uncompressed tar stream."
+    )
+
+    uncompressed_size: int = Field(..., description="Uncompressed size of the frame.")
+
+
+class SeekableMember(BaseModel):
+    """Tar member location inside the seekable archive."""
+
+    name: str = Field(..., description="Path of the member in archive.")
+
+    type: str = Field(
+        ...,
+        description="Tar member type ('file', 'dir', 'symlink', 'link' or 'other').",
+    )
+
+    mode: int = Field(..., description="Permission bits of the member.")
+
+    size: int = Field(..., description="Size of the member data.")
+
+    linkname: str = Field(default="", description="Target of symbolic or hard link.")
+
+    frame: int = Field(..., description="Index of the frame containing member data.")
+
+    offset: int = Field(
+        ..., description="Offset of member data within uncompressed frame."
+    )
+
+
+class SeekableIndex(BaseModel):
+    """Index of frames and members of the seekable archive."""
+
+    archive: str = Field(..., description="Name of the indexed archive.")
+
+    frames: List[SeekableFrame] = Field(..., description="Frames in archive order.")
+
+    members: List[SeekableMember] = Field(..., description="Members in archive order.")
+
+
+def _member_type(member: tarfile.TarInfo) -> str:
+    if member.isreg():
+        return "file"
+    if member.isdir():
+        return "dir"
+    if member.issym():
+        return "symlink"
+    if member.islnk():
+        return "link"
+    return "other"
+
+
+class _FrameWriter:
+    """File object compressing written data into independent xz streams (frames)."""
+
+    def __init__(self, output: BinaryIO, preset: int):
+        self._output = output
+        self._preset = preset
+        self._compressor = None
+        self.frames: List[SeekableFrame] = []
+        self.position = 0
+
+    @property
+    def frame_size(self) -> int:
+        """Gets uncompressed size of currently open frame."""
+        if self._compressor is None:
+            return 0
+        return self.position - self.frames[-1].uncompressed_offset
+
+    def tell(self) -> int:
+        return self.position
+
+    def write(self, data: bytes) -> int:
+        if self._compressor is None:
+            self._compressor = lzma.LZMACompressor(
+                format=lzma.FORMAT_XZ, check=lzma.CHECK_CRC64, preset=self._preset
+            )
+            self.frames.append(
+                SeekableFrame(
+                    compressed_offset=self._output.tell(),
+                    compressed_size=0,
+                    uncompressed_offset=self.position,
+                    uncompressed_size=0,
+                )
+            )
+        self._output.write(self._compressor.compress(data))
+        self.position += len(data)
+        return len(data)
+
+    def finish_frame(self):
+        """Closes currently open frame, next write starts a new one."""
+
+        if self._compressor is None:
+            return
+        self._output.write(self._compressor.flush())
+        frame = self.frames[-1]
+        frame.compressed_size = self._output.tell() - frame.compressed_offset
+        frame.uncompressed_size = self.position - frame.uncompressed_offset
+        self._compressor = None
+
+
+def write_seekable_archive(
+    members: Iterable[TarMember],
+    archive_path: str,
+    frame_size: int = DEFAULT_FRAME_SIZE,
+    preset: int = 6,
+) -> str:
+    """
+    Writes tar members into seekable .tar.xz archive and writes its sidecar index.
+
+    Archive is a sequence of independent xz streams aligned to tar members, so it remains
+    a valid .tar.xz archive for any xz decoder.
+
+    Args:
+        members: Tar members to write.
+        archive_path: Path where to store the archive (.tar.xz).
+        frame_size: Uncompressed size after which new frame is started.
+        preset: xz compression preset.
+
+    Returns: Path of the written index.
+    """
+
+    index_members: List[SeekableMember] = []
+    with open(archive_path, "wb") as output:
+        frames = _FrameWriter(output, preset)
+        target_tar = tarfile.open(fileobj=frames, mode="w", format=tarfile.PAX_FORMAT)
+        for member, data in members:
+            if frames.frame_size >= frame_size:
+                frames.finish_frame()
+
+            target_tar.addfile(member, data)
+
+            # Data is stored right before the end of the member padded to tar block size
+            padded_size = -(-member.size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+            data_offset = frames.position - (padded_size if data else 0)
+            index_members.append(
+                SeekableMember(
+                    name=member.name,
+                    type=_member_type(member),
+                    mode=member.mode,
+                    size=member.size if data else 0,
+                    linkname=member.linkname,
+                    frame=len(frames.frames) - 1,
+                    offset=data_offset - frames.frames[-1].uncompressed_offset,
+                )
+            )
+        target_tar.close()
+        frames.finish_frame()
+
+    index_path = get_sidecar_path(archive_path, ".index.json")
+    index = SeekableIndex(
+        archive=os.path.basename(archive_path),
+        frames=frames.frames,
+        members=index_members,
+    )
+    with open(index_path, "w") as index_file:
+        index_file.write(index.model_dump_json())
+    return index_path
+
+
+class SeekableArchive:
+    """Provides random access to members of seekable archive without decompressing it as a whole."""
+
+    _READ_SIZE = 64 * 1024
+
+    def __init__(self, archive_path: str, index_path: Optional[str] = None):
+        self._archive_path = archive_path
+        with open(
+            index_path or get_sidecar_path(archive_path, ".index.json"), "r"
+        ) as file:
+            self._index = SeekableIndex.model_validate(json.load(file))
+        self._members: Dict[str, SeekableMember] = {
+            member.name.rstrip("/"): member for member in self._index.members
+        }
+
+    def members(self) -> List[SeekableMember]:
+        """Lists all archive members."""
+        return list(self._index.members)
+
+    def get_member(self, name: str) -> SeekableMember:
+        """Gets archive member by its path."""
+        member = self._members.get(name.rstrip("/"))
+        if member is None:
+            raise KeyError(f"Member '{name}' not found in '{self._archive_path}'!")
+        return member
+
+    def _resolve(self, member: SeekableMember) -> SeekableMember:
+        # Hard links store data only in the first occurrence of the file
+        while member.type == "link":
+            member = self.get_member(member.linkname)
+        return member
+
+    def read_chunks(self, name: str) -> Iterator[bytes]:
+        """
+        Reads data of a single member by seeking directly to its frame.
+
+        Args:
+            name: Path of the member in archive.
+
+        Returns: Iterator over member data chunks (memory use does not depend on member size).
+        """
+
+        member = self._resolve(self.get_member(name))
+        if member.type != "file":
+            raise ValueError(f"Member '{name}' is not a regular file!")
+        frame = self._index.frames[member.frame]
+
+        decompressor = lzma.LZMADecompressor(format=lzma.FORMAT_XZ)
+        skip = member.offset
+        remaining = member.size
+        with open(self._archive_path, "rb") as archive:
+            archive.seek(frame.compressed_offset)
+            compressed_left = frame.compressed_size
+            pending = b""
+            while remaining > 0:
+                if decompressor.needs_input:
+                    if compressed_left <= 0:
+                        raise EOFError(f"Frame of member '{name}' is truncated!")
+                    pending = archive.read(min(self._READ_SIZE, compressed_left))
+                    compressed_left -= len(pending)
+                data = decompressor.decompress(pending, max_length=self._READ_SIZE)
+                pending = b""
+                if skip:
+                    skipped = min(skip, len(data))
+                    skip -= skipped
+                    data = data[skipped:]
+                if data:
+                    data = data[:remaining]
+                    remaining -= len(data)
+                    yield data
+
+    def extract(self, name: str, path: str):
+        """
+        Extracts a single member to given path.
+
+        Args:
+            name: Path of the member in archive.
+            path: Output path of the extracted member.
+        """
+
+        member = self.get_member(name)
+        if member.type == "dir":
+            os.makedirs(path, exist_ok=True)
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if member.type == "symlink":
+            if os.path.lexists(path):
+                os.remove(path)
+            os.symlink(member.linkname, path)
+            return
+
+        with open(path, "wb") as output:
+            for chunk in self.read_chunks(name):
+                output.write(chunk)
+        os.chmod(path, self._resolve(member).mode)
+
+    def extract_to(self, name: str, output_dir: str) -> str:
+        """
+        Extracts a single member into output directory keeping its archive path.
+
+        Args:
+            name: Path of the member in archive.
+            output_dir: Directory where member is extracted.
+
+        Returns: Path of the extracted member.
+        """
+
+        path = os.path.abspath(os.path.join(output_dir, name))
+        root = os.path.abspath(output_dir)
+        if os.path.commonpath([root, path]) != root:
+            raise ValueError(
+                f"Member '{name}' would be extracted outside '{output_dir}'!"
+            )
+        self.extract(name, path)
+        return path
@@ -0,0 +1,77 @@
+import io
+import lzma
+import tarfile
+from typing import BinaryIO, Iterable, Iterator, Optional, Tuple
+
+
+class ChunkStream(io.RawIOBase):
+    """Read-only file object over an iterable of byte chunks (i.e. Docker archive stream)."""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks: Iterator[bytes] = iter(chunks)
+        self._chunk: Optional[memoryview] = None
+        self._offset = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while self._chunk is None or self._offset >= len(self._chunk):
+            try:
+                self._chunk = memoryview(next(self._chunks))
+            except StopIteration:
+                return 0
+            self._offset = 0
+
+        size = min(len(buffer), len(self._chunk) - self._offset)
+        buffer[:size] = self._chunk[self._offset : self._offset + size]
+        self._offset += size
+        return size
+
+
+def open_chunk_stream(chunks: Iterable[bytes]) -> io.BufferedReader:
+    """
+    Wraps iterable of byte chunks into buffered file object.
+
+    Args:
+        chunks: Iterable of byte chunks.
+
+    Returns: Buffered file object reading the concatenated chunks.
+    """
+
+    return io.BufferedReader(ChunkStream(chunks), buffer_size=1024 * 1024)
+
+
+TarMember = Tuple[tarfile.TarInfo, Optional[BinaryIO]]
+"""Tar member header together with its data (`None` for members without data)."""
+
+
+def iter_tar_members(source: BinaryIO) -> Iterator[TarMember]:
+    """
+    Iterates members of uncompressed tar stream in a single pass.
+
+    Args:
+        source: Readable tar stream (does not need to be seekable).
+
+    Returns: Iterator over members, data of each member is valid only until next one is requested.
+    """
+
+    with tarfile.open(fileobj=source, mode="r|") as tar:
+        for member in tar:
+            yield member, tar.extractfile(member) if member.isreg() else None
+
+
+def write_xz_archive(members: Iterable[TarMember], archive_path: str, preset: int = 6):
+    """
+    Writes tar members into .tar.xz archive.
+
+    Args:
+        members: Tar members to write.
+        archive_path: Path where to store the archive.
+        preset: xz compression preset.
+    """
+
+    with lzma.open(archive_path, "wb", preset=preset) as xz_file:
+        with tarfile.open(fileobj=xz_file, mode="w", format=tarfile.PAX_FORMAT) as tar:
+            for member, data in members:
+                tar.addfile(member, data)
@@ -1,6 +1,4 @@
-import lzma
 import os
-import tarfile
 from typing import Optional
 
 from pydantic import Field
@@ -10,6 +8,7 @@ from archive.paths import (
     get_output_dir_from_archive_path,
 )
 from clang.tags import DockerImageTags
+from disk.budget import GiB
 from toolchain.base import ToolchainBaseArgs, ToolchainBaseApp
 
 
@@ -30,7 +29,7 @@ class BuildClangApp(ToolchainBaseApp[BuildClangArgs]):
     """Build Clang cross compiler with hermetic sysroot."""
 
     def __init__(self):
-        super().__init__("clang", DockerImageTags.CLANG)
+        super().__init__("clang", DockerImageTags.CLANG, DockerImageTags.BASE)
         self._build_path = os.path.dirname(os.path.abspath(__file__))
         self._clang_single_stage_dockerfile = "Dockerfile.clang_single_stage"
         self._clang_two_stage_dockerfile = "Dockerfile.clang_two_stage"
@@ -42,16 +41,30 @@ class BuildClangApp(ToolchainBaseApp[BuildClangArgs]):
         """Returns Clang artifact name as uploaded to release artifacts."""
         return f"clang+llvm-{self.args.llvm_version}-x86_64-linux-gnu.tar.xz"
 
+    @property
+    def _components_manifest_path(self):
+        """Returns path to the manifest used to split Clang artifact into components."""
+        return os.path.join(self._build_path, "components.json")
+
+    @property
+    def _input_archives(self):
+        """Returns sysroot and host LLVM archives unpacked for the build."""
+        return [self.args.sysroot_path, self.args.host_llvm]
+
+    @property
+    def _build_disk_estimate(self):
+        """Returns estimated disk space used by Clang build (two stage build needs more space)."""
+        return (45 if self.args.host_llvm else 70) * GiB
+
+    @property
+    def _export_disk_estimate(self):
+        """Returns estimated disk space used by Clang archives."""
+        return 10 * GiB
+
     def _unpack_sysroot(self):
         """Unpack sysroot from cache."""
 
-        self.logger.info(f"Unpacking {os.path.basename(self.args.sysroot_path)}...")
-        with lzma.open(self.args.sysroot_path, "rb") as xz_file:
-            with tarfile.open(fileobj=xz_file) as tar:
-                tar.extractall(path=self._sysroot_path, filter="tar")
-        self.logger.info(
-            f"Successfully unpacked {os.path.basename(self.args.sysroot_path)}!"
-        )
+        self._unpack_archive(self.args.sysroot_path, self._sysroot_path)
 
     def _unpack_host_clang(self):
         """Unpacks given host LLVM archive."""
@@ -61,11 +74,7 @@ class BuildClangApp(ToolchainBaseApp[BuildClangArgs]):
                 "Requested unpacking of host clang, but 'host-llvm' argument not provided!"
             )
 
-        self.logger.info(f"Unpacking '{self.args.host_llvm}'...")
-        with lzma.open(self.args.host_llvm, "rb") as xz_file:
-            with tarfile.open(fileobj=xz_file) as tar:
-                tar.extractall(path=self._host_clang_path, filter="tar")
-        self.logger.info(f"Successfully unpacked {self.args.host_llvm}!")
+        self._unpack_archive(self.args.host_llvm, self._host_clang_path)
 
     def _build_clang_single_stage(self):
         """Builds Clang by using provided host Clang compiler."""
@@ -76,12 +85,10 @@ class BuildClangApp(ToolchainBaseApp[BuildClangArgs]):
             )
 
         self.logger.info(f"Building clang-{self.args.llvm_version}...")
-        response = self.docker.api.build(
+        self._docker_build(
             path=self._build_path,
             dockerfile=self._clang_single_stage_dockerfile,
             tag=DockerImageTags.CLANG,
-            rm=True,
-            decode=True,
             buildargs={
                 "SRC_SYSROOT_DIR": os.path.relpath(
                     os.path.join(
@@ -103,11 +110,6 @@ class BuildClangApp(ToolchainBaseApp[BuildClangArgs]):
                 "LLVM_VERSION": self.args.llvm_version,
             },
         )
-        for chunk in response:
-            if "stream" in chunk:
-                self.logger.info(chunk["stream"].strip())
-            if "error" in chunk:
-                raise RuntimeError(chunk["error"].strip())
         self.logger.info(f"clang-{self.args.llvm_version} was successfully built!")
 
     def _build_clang_two_stage(self):
@@ -117,12 +119,10 @@ class BuildClangApp(ToolchainBaseApp[BuildClangArgs]):
         """
 
         self.logger.info(f"Building clang-{self.args.llvm_version}...")
-        response = self.docker.api.build(
+        self._docker_build(
             path=self._build_path,
             dockerfile=self._clang_two_stage_dockerfile,
             tag=DockerImageTags.CLANG,
-            rm=True,
-            decode=True,
             buildargs={
                 "SRC_SYSROOT_DIR": os.path.relpath(
                     os.path.join(
@@ -137,11 +137,6 @@ class BuildClangApp(ToolchainBaseApp[BuildClangArgs]):
                 "LLVM_VERSION": self.args.llvm_version,
             },
         )
-        for chunk in response:
-            if "stream" in chunk:
-                self.logger.info(chunk["stream"].strip())
-            if "error" in chunk:
-                raise RuntimeError(chunk["error"].strip())
         self.logger.info(f"clang-{self.args.llvm_version} was successfully built!")
 
     def _build_toolchain(self):
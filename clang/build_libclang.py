@@ -1,6 +1,4 @@
-import lzma
 import os
-import tarfile
 
 from pydantic import Field
 
@@ -9,6 +7,7 @@ from archive.paths import (
     get_output_dir_from_archive_path,
 )
 from clang.tags import DockerImageTags
+from disk.budget import GiB
 from toolchain.base import ToolchainBaseArgs, ToolchainBaseApp
 
 
@@ -27,7 +26,7 @@ class BuildLibClangApp(ToolchainBaseApp[BuildLibClangArgs]):
     """Build libclang for usage with clang.cindex python bindings."""
 
     def __init__(self):
-        super().__init__("libclang", DockerImageTags.LIBCLANG)
+        super().__init__("libclang", DockerImageTags.LIBCLANG, DockerImageTags.BASE)
         self._build_path = os.path.dirname(os.path.abspath(__file__))
         self._libclang_dockerfile = "Dockerfile.libclang"
         self._host_clang_path = os.path.join(self._build_path, "ci/clang-x86_64-host")
@@ -37,25 +36,34 @@ class BuildLibClangApp(ToolchainBaseApp[BuildLibClangArgs]):
         """Returns libclang artifact name as uploaded to release artifacts."""
         return f"libclang-{self.args.llvm_version}-x86_64-linux-gnu.tar.xz"
 
+    @property
+    def _input_archives(self):
+        """Returns host Clang archive unpacked for the build."""
+        return [self.args.compiler]
+
+    @property
+    def _build_disk_estimate(self):
+        """Returns estimated disk space used by libclang build."""
+        return 40 * GiB
+
+    @property
+    def _export_disk_estimate(self):
+        """Returns estimated disk space used by libclang archives."""
+        return 2 * GiB
+
     def _unpack_host_clang(self):
         """Unpacks given host Clang archive."""
 
-        self.logger.info(f"Unpacking '{self.args.compiler}'...")
-        with lzma.open(self.args.compiler, "rb") as xz_file:
-            with tarfile.open(fileobj=xz_file) as tar:
-                tar.extractall(path=self._host_clang_path, filter="tar")
-        self.logger.info(f"Successfully unpacked {self.args.compiler}!")
+        self._unpack_archive(self.args.compiler, self._host_clang_path)
 
     def _build_libclang(self):
         """Builds libclang by using provided host Clang compiler."""
 
         self.logger.info(f"Building libclang-{self.args.llvm_version}...")
-        response = self.docker.api.build(
+        self._docker_build(
             path=self._build_path,
             dockerfile=self._libclang_dockerfile,
             tag=DockerImageTags.LIBCLANG,
-            rm=True,
-            decode=True,
             buildargs={
                 "SRC_HOST_COMPILER_DIR": os.path.relpath(
                     os.path.join(
@@ -70,11 +78,6 @@ class BuildLibClangApp(ToolchainBaseApp[BuildLibClangArgs]):
                 "LLVM_VERSION": self.args.llvm_version,
             },
         )
-        for chunk in response:
-            if "stream" in chunk:
-                self.logger.info(chunk["stream"].strip())
-            if "error" in chunk:
-                raise RuntimeError(chunk["error"].strip())
         self.logger.info(f"clang-{self.args.llvm_version} was successfully built!")
 
     def _build_toolchain(self):
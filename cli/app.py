@@ -1,12 +1,15 @@
 from abc import ABC, abstractmethod
 import argparse
+from contextvars import ContextVar
 import logging
-import os
 import sys
 from typing import (
+    Any,
+    Dict,
     Generic,
     List,
     Literal,
+    Optional,
     TypeVar,
     Union,
     get_args,
@@ -16,17 +19,46 @@ from typing import (
 
 import docker
 
-from github import Auth, Github
+from archive.cache import UnpackCache
+from farm.pool import WorkerPool
 
 TCliArgs = TypeVar("TCliArgs")
 
 
+class CliContext:
+    """
+    Clients and caches shared by CLI applications running in the same long-lived process (i.e. build agent).
+
+    Applications constructed while context is active (see `CliApp.activate_context`) parse arguments from
+    the context instead of `sys.argv` and reuse its clients instead of creating new ones.
+    """
+
+    def __init__(
+        self,
+        worker_pool: WorkerPool,
+        unpack_cache: Optional[UnpackCache] = None,
+    ):
+        self.worker_pool = worker_pool
+        self.unpack_cache = unpack_cache
+        self.argv: Optional[List[str]] = None
+        self.prog: Optional[str] = None
+        """Name of the script shown in usage of applications parsing `argv`."""
+        self.releases: Dict[str, Dict[str, Any]] = {}
+        """Cache of releases (by repository and tag) shared between builds."""
+
+
+_current_context: ContextVar[Optional[CliContext]] = ContextVar(
+    "cli_context", default=None
+)
+
+
 class CliApp(ABC, Generic[TCliArgs]):
     def __init__(self, name: str):
         self._Model = get_args(self.__orig_bases__[0])[0]
         self._app_name = name
         self._docker = None
-        self._github = None
+        self._worker_pool = None
+        self._context = _current_context.get()
         self._setup_logger()
         self._parse_args()
 
@@ -35,6 +67,10 @@ class CliApp(ABC, Generic[TCliArgs]):
         self._logger = logging.getLogger(self._app_name)
         self._logger.setLevel(level=logging.INFO)
 
+        # Logger is shared by all instances of the application within a process
+        if self._logger.handlers:
+            return
+
         # Create a StreamHandler to log to stdout
         stream_handler = logging.StreamHandler(sys.stdout)
 
@@ -48,7 +84,8 @@ class CliApp(ABC, Generic[TCliArgs]):
     def _parse_args(self):
         """Utility function to parse CLI arguments."""
 
-        parser = argparse.ArgumentParser(description=self._Model.__doc__)
+        prog = self._context.prog if self._context is not None else None
+        parser = argparse.ArgumentParser(description=self._Model.__doc__, prog=prog)
         for field_name, field_type in get_type_hints(self._Model).items():
             field_info = self._Model.__fields__[field_name]
             arg_name = f'--{field_name.replace("_", "-")}'
@@ -112,7 +149,8 @@ class CliApp(ABC, Generic[TCliArgs]):
                     nargs=nargs,
                 )
 
-        self._args = self._Model.model_validate(vars(parser.parse_args()))
+        argv = self._context.argv if self._context is not None else None
+        self._args = self._Model.model_validate(vars(parser.parse_args(argv)))
 
     @property
     def logger(self) -> logging.Logger:
@@ -124,21 +162,32 @@ class CliApp(ABC, Generic[TCliArgs]):
         """Gets provided CLI arguments."""
         return self._args
 
+    @property
+    def context(self) -> Optional[CliContext]:
+        """Gets shared context the application was created in (`None` for standalone run)."""
+        return self._context
+
+    @staticmethod
+    def activate_context(context: Optional[CliContext]):
+        """Sets shared context used by applications created afterwards in the current thread."""
+        _current_context.set(context)
+
+    @property
+    def worker_pool(self) -> WorkerPool:
+        """Gets pool of Docker endpoints configured through `DOCKER_HOSTS` environment variable."""
+        if self._worker_pool is None:
+            if self._context is not None:
+                self._worker_pool = self._context.worker_pool
+            else:
+                self._worker_pool = WorkerPool.from_env(self.logger)
+        return self._worker_pool
+
     @property
     def docker(self) -> docker.DockerClient:
         if self._docker is None:
-            self._docker = docker.from_env()
+            self._docker = self.worker_pool.select().client
         return self._docker
 
-    @property
-    def github(self) -> Github:
-        if self._github is None:
-            if "GITHUB_TOKEN" not in os.environ:
-                raise EnvironmentError("Environment variable 'GITHUB_TOKEN' not set!")
-            auth = Auth.Token(os.environ["GITHUB_TOKEN"])
-            self._github = Github(auth=auth)
-        return self._github
-
     @abstractmethod
     def run(self):
         """Runs the CLI application logic."""
@@ -0,0 +1,301 @@
+import calendar
+import glob
+import logging
+import os
+import shutil
+import time
+from typing import Callable, Iterable, List, Optional
+
+import docker
+from docker.errors import APIError, ImageNotFound
+
+from archive.cache import UnpackCache
+
+GiB = 1024 * 1024 * 1024
+
+
+class EvictionCandidate:
+    """Single item (file, directory, image, cache) which can be removed to free disk space."""
+
+    def __init__(
+        self, name: str, size: int, last_used: float, evict: Callable[[], None]
+    ):
+        self.name = name
+        self.size = size
+        self.last_used = last_used
+        self.evict = evict
+
+
+TCandidateSource = Callable[[], Iterable[EvictionCandidate]]
+
+
+def _path_size(path: str) -> int:
+    if not os.path.isdir(path) or os.path.islink(path):
+        return os.lstat(path).st_size
+    size = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                size += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return size
+
+
+def _remove_path(path: str):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.lexists(path):
+        os.remove(path)
+
+
+def path_candidates(
+    patterns: List[str], exclude: Iterable[str] = ()
+) -> TCandidateSource:
+    """
+    Creates candidate source of files and directories matching glob patterns.
+
+    Args:
+        patterns: Glob patterns of removable files and directories.
+        exclude: Paths which must never be removed (i.e. inputs of the current build).
+
+    Returns: Candidate source using modification time as last use time.
+    """
+
+    excluded = {os.path.abspath(path) for path in exclude if path}
+
+    def source():
+        for pattern in patterns:
+            for path in glob.glob(pattern):
+                path = os.path.abspath(path)
+                if path in excluded or any(
+                    os.path.commonpath([path, excluded_path]) == path
+                    for excluded_path in excluded
+                ):
+                    continue
+                yield EvictionCandidate(
+                    name=path,
+                    size=_path_size(path),
+                    last_used=os.lstat(path).st_mtime,
+                    evict=lambda path=path: _remove_path(path),
+                )
+
+    return source
+
+
+def unpack_cache_candidates(
+    cache: UnpackCache, exclude: Iterable[str] = ()
+) -> TCandidateSource:
+    """
+    Creates candidate source of unpacked archives stored in unpack cache.
+
+    Args:
+        cache: Unpack cache.
+        exclude: Paths of archives whose unpacked copies must never be removed (i.e. inputs of the current build).
+
+    Returns: Candidate source using last materialization time as last use time.
+    """
+
+    def source():
+        excluded = {
+            cache.digest(path) for path in exclude if path and os.path.exists(path)
+        }
+        for digest, path, last_used in cache.entries():
+            if digest in excluded:
+                continue
+            yield EvictionCandidate(
+                name=f"unpack cache {digest[:12]}",
+                size=_path_size(path),
+                last_used=last_used,
+                evict=lambda digest=digest: cache.evict(digest),
+            )
+
+    return source
+
+
+def docker_candidates(
+    client: docker.DockerClient,
+    image_tags: Iterable[str],
+    keep_tags: Iterable[str],
+    exclusive: Callable[[], bool] = lambda: True,
+) -> TCandidateSource:
+    """
+    Creates candidate source of Docker images and build cache.
+
+    Images used by any container (running or stopped) are never evicted. When other builds
+    share the daemon, only dangling images are evicted, as owned images and build cache may
+    belong to those builds.
+
+    Args:
+        client: Docker client of the daemon running builds.
+        image_tags: Image tags owned by the toolchain builds which can be removed.
+        keep_tags: Image tags required by the current build.
+        exclusive: Verifies that no other build currently uses the daemon.
+
+    Returns: Candidate source of dangling images, owned images and unused build cache.
+    """
+
+    keep = set(keep_tags)
+
+    def remove_image(image_id: str):
+        try:
+            client.images.remove(image_id, force=False, noprune=False)
+        except (APIError, ImageNotFound):
+            pass
+
+    def source():
+        used = {
+            container.attrs.get("Image")
+            for container in client.containers.list(all=True)
+        }
+        for image in client.images.list(filters={"dangling": True}):
+            if image.id in used:
+                continue
+            yield EvictionCandidate(
+                name=f"dangling image {image.short_id}",
+                size=image.attrs.get("Size", 0),
+                last_used=0.0,
+                evict=lambda image_id=image.id: remove_image(image_id),
+            )
+
+        if not exclusive():
+            return
+
+        for tag in set(image_tags) - keep:
+            try:
+                image = client.images.get(tag)
+            except ImageNotFound:
+                continue
+            if image.id in used:
+                continue
+            last_tag_time = image.attrs.get("Metadata", {}).get("LastTagTime", "")
+            yield EvictionCandidate(
+                name=f"image {tag}",
+                size=image.attrs.get("Size", 0),
+                last_used=_parse_docker_time(last_tag_time),
+                evict=lambda tag=tag: remove_image(tag),
+            )
+
+        build_cache = [
+            entry
+            for entry in client.df().get("BuildCache") or []
+            if not entry.get("InUse")
+        ]
+        if build_cache:
+            yield EvictionCandidate(
+                name="docker build cache",
+                size=sum(entry.get("Size", 0) for entry in build_cache),
+                last_used=max(
+                    _parse_docker_time(entry.get("LastUsedAt") or "")
+                    for entry in build_cache
+                ),
+                evict=lambda: client.api.prune_builds(),
+            )
+
+    return source
+
+
+def _parse_docker_time(value: str) -> float:
+    """Parses RFC 3339 timestamp returned by Docker API (0 if missing)."""
+
+    if not value or value.startswith("0001-"):
+        return 0.0
+    # Fraction of seconds (nanosecond precision) is not supported by strptime and ignored
+    try:
+        return float(calendar.timegm(time.strptime(value[:19], "%Y-%m-%dT%H:%M:%S")))
+    except ValueError:
+        return 0.0
+
+
+class DiskBudget:
+    """
+    Keeps enough free disk space for build phases by evicting least recently used caches.
+
+    Candidates from all registered sources (local files, unpack cache, Docker images and
+    build cache) are evicted in order of their last use until the phase estimate fits.
+    """
+
+    def __init__(
+        self, paths: List[str], logger: logging.Logger, reserve: int = 2 * GiB
+    ):
+        """
+        Args:
+            paths: Paths on file systems used by the build (i.e. build context, temporary directory).
+            logger: Logger used to report evictions.
+            reserve: Free space always kept on top of the phase estimate.
+        """
+
+        self._paths = paths
+        self._logger = logger
+        self._reserve = reserve
+        self._sources: List[TCandidateSource] = []
+
+    def add_source(self, source: TCandidateSource):
+        """Registers source of eviction candidates."""
+        self._sources.append(source)
+
+    def free_space(self) -> int:
+        """Gets free space on the most constrained file system used by the build."""
+
+        free = []
+        for path in self._paths:
+            # Path may not exist yet, measure its closest existing parent
+            while not os.path.exists(path) and os.path.dirname(path) != path:
+                path = os.path.dirname(path)
+            free.append(shutil.disk_usage(path).free)
+        return min(free)
+
+    def ensure(self, phase: str, required: int):
+        """
+        Evicts least recently used candidates until required space plus reserve is free.
+
+        Args:
+            phase: Name of the build phase (used for logging).
+            required: Estimated number of bytes the phase needs.
+        """
+
+        needed = required + self._reserve
+        free = self.free_space()
+        self._logger.info(
+            f"Disk budget for phase '{phase}': {free / GiB:.1f} GiB free, {needed / GiB:.1f} GiB needed."
+        )
+        if free >= needed:
+            return
+
+        candidates: List[EvictionCandidate] = []
+        for source in self._sources:
+            try:
+                candidates.extend(source())
+            except (APIError, OSError) as error:
+                self._logger.warning(f"Failed to list eviction candidates: {error}")
+        candidates.sort(key=lambda candidate: candidate.last_used)
+
+        for candidate in candidates:
+            if free >= needed:
+                break
+            self._logger.info(
+                f"Evicting {candidate.name} ({candidate.size / GiB:.2f} GiB)..."
+            )
+            try:
+                candidate.evict()
+            except (APIError, OSError) as error:
+                self._logger.warning(f"Failed to evict {candidate.name}: {error}")
+            free = self.free_space()
+
+        if free < needed:
+            self._logger.warning(
+                f"Only {free / GiB:.1f} GiB free for phase '{phase}' which needs an estimated {needed / GiB:.1f} GiB!"
+            )
+
+    def release(self, paths: Iterable[Optional[str]]):
+        """
+        Removes files and directories no longer needed after a finished phase.
+
+        Args:
+            paths: Paths to remove (missing paths are ignored).
+        """
+
+        for path in paths:
+            if path and os.path.lexists(path):
+                self._logger.info(f"Removing '{path}'...")
+                _remove_path(path)
@@ -0,0 +1,302 @@
+import logging
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional, TypeVar
+
+import docker
+from docker.errors import DockerException, ImageNotFound
+from requests.exceptions import RequestException
+
+TResult = TypeVar("TResult")
+
+RESERVATION_LABEL = "cc-toolchain-builds.reservation"
+"""Label of Docker volumes reserving a worker for a build (value is creation timestamp)."""
+
+RESERVATION_TTL = 12 * 60 * 60
+"""Age (in seconds) after which reservation left behind by a crashed build is ignored."""
+
+
+class DockerWorker:
+    """Single Docker endpoint (local socket, TCP or SSH URL) which can run toolchain builds."""
+
+    def __init__(self, url: Optional[str] = None):
+        self._url = url
+        self._client = None
+        self._ncpu = None
+
+    @property
+    def name(self) -> str:
+        """Gets human readable name of the worker."""
+        return self._url or "local"
+
+    @property
+    def url(self) -> Optional[str]:
+        """Gets Docker endpoint URL (`None` for endpoint configured through standard Docker environment)."""
+        return self._url
+
+    @property
+    def is_local(self) -> bool:
+        """Verifies if worker runs on this machine (shares local file systems)."""
+        return self._url is None or self._url.startswith("unix://")
+
+    @property
+    def client(self) -> docker.DockerClient:
+        """Gets Docker client connected to the worker endpoint."""
+        if self._client is None:
+            if self._url is None:
+                self._client = docker.from_env()
+            else:
+                # TCP endpoints use TLS configured the same way as for docker CLI
+                tls = False
+                if self._url.startswith("tcp://"):
+                    tls = docker.utils.kwargs_from_env().get("tls", False)
+                self._client = docker.DockerClient(
+                    base_url=self._url,
+                    use_ssh_client=self._url.startswith("ssh://"),
+                    tls=tls,
+                    timeout=600,
+                )
+        return self._client
+
+    @property
+    def ncpu(self) -> int:
+        """Gets number of CPUs available to the Docker daemon."""
+        if self._ncpu is None:
+            self._ncpu = max(int(self.client.info().get("NCPU", 1)), 1)
+        return self._ncpu
+
+    def load(self) -> float:
+        """
+        Calculates current load of the worker.
+
+        Running containers include intermediate build containers, so load also accounts
+        for builds scheduled by other processes sharing the same endpoint. Every reserved
+        build counts as one fully loaded worker, so builds placed at the same time (before
+        their containers start) spread across workers.
+
+        Returns: Number of running containers per available CPU plus number of reservations.
+        """
+
+        running = int(self.client.info().get("ContainersRunning", 0))
+        return running / self.ncpu + self.reservations()
+
+    def reservations(self) -> int:
+        """Gets number of builds currently reserved on the worker (by any process)."""
+
+        now = time.time()
+        volumes = self.client.volumes.list(filters={"label": RESERVATION_LABEL})
+        return sum(
+            1
+            for volume in volumes
+            if now - float(volume.attrs["Labels"][RESERVATION_LABEL]) < RESERVATION_TTL
+        )
+
+    def reserve(self) -> str:
+        """
+        Reserves the worker for a build until the reservation is released.
+
+        Reservation is a labelled Docker volume, so it is visible to all processes placing builds.
+
+        Returns: Name of the reservation.
+        """
+
+        volume = self.client.volumes.create(
+            name=f"cc-toolchain-builds-reservation-{os.getpid()}-{time.time_ns()}",
+            labels={RESERVATION_LABEL: str(time.time())},
+        )
+        return volume.name
+
+    def release(self, reservation: str):
+        """Releases reservation created by `reserve` (failures are ignored, reservations expire)."""
+        try:
+            self.client.volumes.get(reservation).remove(force=True)
+        except (DockerException, RequestException):
+            pass
+
+    def is_alive(self) -> bool:
+        """Verifies if worker endpoint is reachable."""
+        try:
+            return bool(self.client.ping())
+        except (DockerException, RequestException):
+            return False
+
+    def image_id(self, tag: str) -> Optional[str]:
+        """
+        Gets content addressable id of the image with given tag.
+
+        Args:
+            tag: Tag of the image.
+
+        Returns: Image digest or `None` if image is not present on this worker.
+        """
+
+        try:
+            return self.client.images.get(tag).id
+        except ImageNotFound:
+            return None
+
+
+class WorkerPool:
+    """Pool of Docker endpoints used to place toolchain builds across multiple machines."""
+
+    HOSTS_ENV = "DOCKER_HOSTS"
+    """Environment variable with comma separated list of Docker endpoints."""
+
+    def __init__(self, urls: List[Optional[str]], logger: logging.Logger):
+        if not urls:
+            raise ValueError("Worker pool requires at least one Docker endpoint!")
+        self._workers = [DockerWorker(url) for url in urls]
+        self._failed: Dict[str, DockerWorker] = {}
+        self._lock = threading.Lock()
+        self._logger = logger
+
+    @classmethod
+    def from_env(cls, logger: logging.Logger) -> "WorkerPool":
+        """
+        Creates worker pool from endpoints listed in `DOCKER_HOSTS` environment variable.
+
+        Falls back to a single worker configured through standard Docker environment if not set.
+        """
+
+        hosts = os.environ.get(cls.HOSTS_ENV, "")
+        urls: List[Optional[str]] = [
+            url.strip() for url in hosts.split(",") if url.strip()
+        ]
+        return cls(urls or [None], logger)
+
+    @property
+    def workers(self) -> List[DockerWorker]:
+        """Gets workers which have not been marked as failed."""
+        with self._lock:
+            return [
+                worker for worker in self._workers if worker.name not in self._failed
+            ]
+
+    def _mark_failed(self, worker: DockerWorker):
+        with self._lock:
+            self._failed[worker.name] = worker
+        self._logger.warning(
+            f"Worker '{worker.name}' is unreachable, excluding it from the pool!"
+        )
+
+    def select(self) -> DockerWorker:
+        """
+        Selects the least loaded reachable worker relative to its CPU capacity and reservations.
+
+        Returns: Worker where the next build should be placed.
+        """
+
+        candidates = []
+        for worker in self.workers:
+            try:
+                candidates.append((worker.load(), worker))
+            except (DockerException, RequestException):
+                self._mark_failed(worker)
+
+        if not candidates:
+            raise RuntimeError("No reachable Docker workers left in the pool!")
+
+        # Equally loaded workers are picked randomly, so concurrent placements do not collide
+        random.shuffle(candidates)
+        load, worker = min(candidates, key=lambda candidate: candidate[0])
+        self._logger.info(
+            f"Selected worker '{worker.name}' (load={load:.2f}, cpus={worker.ncpu})."
+        )
+        return worker
+
+    @property
+    def origin(self) -> DockerWorker:
+        """
+        Gets worker of the standard Docker environment, where base images are loaded.
+
+        Returns: Worker with endpoint from `DOCKER_HOST` (or unset endpoint), otherwise the first local worker.
+        """
+
+        host = os.environ.get("DOCKER_HOST")
+        for worker in self._workers:
+            if worker.url is None or worker.url == host:
+                return worker
+        for worker in self._workers:
+            if worker.is_local:
+                return worker
+        raise RuntimeError(
+            "Worker pool does not contain the endpoint where base images are loaded!"
+        )
+
+    def transfer_image(self, tag: str, target: DockerWorker):
+        """
+        Makes image with given tag loaded on the origin worker available on the target worker.
+
+        Image is transferred only if the target is missing it or has a different image under the
+        same tag, and it is verified by its digest after loading.
+
+        Args:
+            tag: Tag of the image to transfer.
+            target: Worker where image is required.
+        """
+
+        source = self.origin
+        source_id = source.image_id(tag)
+        target_id = target.image_id(tag)
+        if source_id is None:
+            if target_id is None:
+                raise RuntimeError(
+                    f"Image '{tag}' is not loaded on worker '{source.name}'!"
+                )
+            self._logger.warning(
+                f"Image '{tag}' is not loaded on worker '{source.name}', using image {target_id} present on '{target.name}'."
+            )
+            return
+        if target is source or target_id == source_id:
+            return
+
+        self._logger.info(
+            f"Transferring image '{tag}' ({source_id}) from '{source.name}' to '{target.name}'..."
+        )
+        image = target.client.images.load(
+            data=source.client.images.get(tag).save(named=True)
+        )[0]
+        if image.id != source_id:
+            raise RuntimeError(
+                f"Digest mismatch after transferring image '{tag}' ({image.id} != {source_id})!"
+            )
+        if not image.tag(repository=tag, tag="latest"):
+            raise RuntimeError(f"Failed to set the tag for image '{tag}'!")
+        self._logger.info(f"Image '{tag}' transferred to '{target.name}'!")
+
+    def run(self, task: Callable[[DockerWorker], TResult]) -> TResult:
+        """
+        Runs the task on selected worker and reschedules it if the worker fails.
+
+        Worker is reserved for the duration of the task. Task must be safe to repeat on another
+        worker, so it should not publish anything (i.e. upload release assets).
+
+        Task failures on a reachable worker (i.e. build errors) are not retried.
+
+        Args:
+            task: Callable receiving the worker it was placed on.
+
+        Returns: Result of the task.
+        """
+
+        while True:
+            worker = self.select()
+            try:
+                reservation = worker.reserve()
+            except (DockerException, RequestException):
+                self._mark_failed(worker)
+                continue
+
+            try:
+                return task(worker)
+            except (DockerException, RequestException):
+                if worker.is_alive():
+                    raise
+                self._mark_failed(worker)
+                self._logger.warning(
+                    f"Rescheduling task previously placed on '{worker.name}'..."
+                )
+            finally:
+                worker.release(reservation)
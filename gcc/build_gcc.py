@@ -1,6 +1,4 @@
-import lzma
 import os
-import tarfile
 from typing import Optional
 
 from pydantic import Field
@@ -10,6 +8,7 @@ from archive.paths import (
     get_output_dir_from_archive_path,
 )
 from gcc.tags import DockerImageTags
+from disk.budget import GiB
 from toolchain.base import ToolchainBaseArgs, ToolchainBaseApp
 
 
@@ -32,7 +31,7 @@ class BuildGccApp(ToolchainBaseApp[BuildGccArgs]):
     """Build GCC cross compiler with hermetic sysroot."""
 
     def __init__(self):
-        super().__init__("gcc", DockerImageTags.GCC)
+        super().__init__("gcc", DockerImageTags.GCC, DockerImageTags.BASE)
         self._build_path = os.path.dirname(os.path.abspath(__file__))
         self._gcc_dockerfile = "Dockerfile.gcc"
         self._gcc_no_host_dockerfile = "Dockerfile.gcc_no_host"
@@ -44,16 +43,30 @@ class BuildGccApp(ToolchainBaseApp[BuildGccArgs]):
         """Returns GCC artifact name as uploaded to release artifacts."""
         return f"gcc-{self.args.gcc_version}-x86_64-linux-gnu.tar.xz"
 
+    @property
+    def _components_manifest_path(self):
+        """Returns path to the manifest used to split GCC artifact into components."""
+        return os.path.join(self._build_path, "components.json")
+
+    @property
+    def _input_archives(self):
+        """Returns sysroot and host GCC archives unpacked for the build."""
+        return [self.args.sysroot_path, self.args.host_gcc]
+
+    @property
+    def _build_disk_estimate(self):
+        """Returns estimated disk space used by GCC and binutils build."""
+        return 20 * GiB
+
+    @property
+    def _export_disk_estimate(self):
+        """Returns estimated disk space used by GCC archives."""
+        return 3 * GiB
+
     def _unpack_sysroot(self):
         """Unpack sysroot from cache."""
 
-        self.logger.info(f"Unpacking {os.path.basename(self.args.sysroot_path)}...")
-        with lzma.open(self.args.sysroot_path, "rb") as xz_file:
-            with tarfile.open(fileobj=xz_file) as tar:
-                tar.extractall(path=self._sysroot_path, filter="tar")
-        self.logger.info(
-            f"Successfully unpacked {os.path.basename(self.args.sysroot_path)}!"
-        )
+        self._unpack_archive(self.args.sysroot_path, self._sysroot_path)
 
     def _unpack_host_gcc(self):
         """Unpacks given host GCC archive."""
@@ -63,22 +76,16 @@ class BuildGccApp(ToolchainBaseApp[BuildGccArgs]):
                 "Requested unpacking of host gcc, but 'host-gcc' argument not provided!"
             )
 
-        self.logger.info(f"Unpacking '{self.args.host_gcc}'...")
-        with lzma.open(self.args.host_gcc, "rb") as xz_file:
-            with tarfile.open(fileobj=xz_file) as tar:
-                tar.extractall(path=self._host_gcc_path, filter="tar")
-        self.logger.info(f"Successfully unpacked {self.args.host_gcc}!")
+        self._unpack_archive(self.args.host_gcc, self._host_gcc_path)
 
     def _build_gcc_no_host(self):
         """Builds GCC by using system provided compiler."""
 
         self.logger.info(f"Building gcc-{self.args.gcc_version}...")
-        response = self.docker.api.build(
+        self._docker_build(
             path=self._build_path,
             dockerfile=self._gcc_no_host_dockerfile,
             tag=DockerImageTags.GCC,
-            rm=True,
-            decode=True,
             buildargs={
                 "SRC_SYSROOT_DIR": os.path.relpath(
                     os.path.join(
@@ -94,11 +101,6 @@ class BuildGccApp(ToolchainBaseApp[BuildGccArgs]):
                 "BINUTILS_VERSION": self.args.binutils_version,
             },
         )
-        for chunk in response:
-            if "stream" in chunk:
-                self.logger.info(chunk["stream"].strip())
-            if "error" in chunk:
-                raise RuntimeError(chunk["error"].strip())
         self.logger.info(f"gcc-{self.args.gcc_version} was successfully built!")
 
     def _build_gcc_with_host(self):
@@ -110,12 +112,10 @@ class BuildGccApp(ToolchainBaseApp[BuildGccArgs]):
             )
 
         self.logger.info(f"Building gcc-{self.args.gcc_version}...")
-        response = self.docker.api.build(
+        self._docker_build(
             path=self._build_path,
             dockerfile=self._gcc_dockerfile,
             tag=DockerImageTags.GCC,
-            rm=True,
-            decode=True,
             buildargs={
                 "SRC_HOST_GCC_DIR": os.path.relpath(
                     os.path.join(
@@ -138,11 +138,6 @@ class BuildGccApp(ToolchainBaseApp[BuildGccArgs]):
                 "BINUTILS_VERSION": self.args.binutils_version,
             },
         )
-        for chunk in response:
-            if "stream" in chunk:
-                self.logger.info(chunk["stream"].strip())
-            if "error" in chunk:
-                raise RuntimeError(chunk["error"].strip())
         self.logger.info(f"gcc-{self.args.gcc_version} was successfully built!")
 
     def _build_toolchain(self):
@@ -52,8 +52,8 @@ class BaseImageApp(CliApp[BaseImageArgs]):
         with open(image_path, "rb") as image_cache_file:
             image_cache = image_cache_file.read()
 
-        # Load image into docker env
-        image = self.docker.images.load(data=image_cache)[0]
+        # Load image into standard docker env, builds transfer it to other workers
+        image = self.worker_pool.origin.client.images.load(data=image_cache)[0]
         if not image.tag(repository=self._image_tag, tag="latest"):
             raise RuntimeError(f"Failed to set the tag for image '{self._image_tag}'!")
 
@@ -65,7 +65,9 @@ class BaseImageApp(CliApp[BaseImageArgs]):
 
         self.logger.info(f"Building image '{self._image_tag}'...")
 
-        response = self.docker.api.build(
+        # Build in standard docker env, builds transfer image from there to other workers
+        client = self.worker_pool.origin.client
+        response = client.api.build(
             path=self._build_path,
             dockerfile=self._dockerfile,
             tag=self._image_tag,
@@ -85,7 +87,7 @@ class BaseImageApp(CliApp[BaseImageArgs]):
             f"Storing image '{self._image_tag}' to cache at '{output_path}'..."
         )
         with open(output_path, "wb") as output:
-            for chunk in self.docker.images.get(self._image_tag).save():
+            for chunk in client.images.get(self._image_tag).save():
                 output.write(chunk)
         self.logger.info(
             f"Image '{self._image_tag}' stored to cache at '{output_path}' successfully!"
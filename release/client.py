@@ -0,0 +1,271 @@
+import asyncio
+import os
+import time
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+import httpx
+from pydantic import BaseModel, Field
+
+
+class ReleaseAsset(BaseModel):
+    """GitHub release asset as returned by the REST API."""
+
+    id: int = Field(..., description="Id of the asset.")
+
+    name: str = Field(..., description="File name of the asset.")
+
+    size: int = Field(..., description="Size of the asset in bytes.")
+
+    content_type: str = Field(default="", description="Content type of the asset.")
+
+
+class RateLimiter:
+    """Limits number of concurrent requests and pauses them when GitHub rate limit is exhausted."""
+
+    def __init__(self, max_concurrency: int, reserve: int = 10):
+        """
+        Args:
+            max_concurrency: Maximum number of requests in flight.
+            reserve: Number of remaining requests at which new requests wait for rate limit reset.
+        """
+
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._reserve = reserve
+        self._remaining: Optional[int] = None
+        self._reset_at = 0.0
+
+    async def __aenter__(self):
+        await self._semaphore.acquire()
+        delay = self.delay()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return self
+
+    async def __aexit__(self, *_):
+        self._semaphore.release()
+
+    def delay(self) -> float:
+        """Calculates how long next request has to wait before it is sent."""
+        if self._remaining is None or self._remaining > self._reserve:
+            return 0.0
+        return max(self._reset_at - time.time(), 0.0)
+
+    def update(self, response: httpx.Response) -> Optional[float]:
+        """
+        Updates rate limit state from response headers.
+
+        Args:
+            response: Response received from GitHub API.
+
+        Returns: Number of seconds to wait before retrying the request if it was rate limited, otherwise `None`.
+        """
+
+        headers = response.headers
+        if "x-ratelimit-remaining" in headers:
+            self._remaining = int(headers["x-ratelimit-remaining"])
+        if "x-ratelimit-reset" in headers:
+            self._reset_at = float(headers["x-ratelimit-reset"])
+
+        if response.status_code not in (403, 429):
+            return None
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+        if self._remaining == 0:
+            return max(self._reset_at - time.time(), 1.0)
+        return None
+
+
+class AsyncReleaseClient:
+    """
+    Asynchronous access to GitHub releases of a single repository over a pooled HTTP/2 connection.
+
+    Usage:
+        async with AsyncReleaseClient("owner/repo", token) as client:
+            assets = await client.list_assets("clang-1")
+    """
+
+    def __init__(
+        self,
+        repository: str,
+        token: Optional[str] = None,
+        api_url: str = "https://api.github.com",
+        max_concurrency: int = 8,
+        max_retries: int = 3,
+        release_cache: Optional[Dict[str, dict]] = None,
+    ):
+        """
+        Args:
+            repository: The owner and repository name.
+            token: GitHub token (read from `GITHUB_TOKEN` environment variable if not set).
+            api_url: Base URL of GitHub REST API (i.e. URL of a local fake server in tests).
+            max_concurrency: Maximum number of requests in flight.
+            max_retries: Maximum number of retries of rate limited requests.
+            release_cache: Releases by tag shared with other clients (i.e. between builds of build agent).
+        """
+
+        self._repository = repository
+        self._token = token or os.environ.get("GITHUB_TOKEN")
+        self._api_url = api_url.rstrip("/")
+        self._max_concurrency = max_concurrency
+        self._max_retries = max_retries
+        self._limiter = RateLimiter(max_concurrency)
+        self._client: Optional[httpx.AsyncClient] = None
+        self._releases: Dict[str, dict] = (
+            release_cache if release_cache is not None else {}
+        )
+
+    async def __aenter__(self) -> "AsyncReleaseClient":
+        headers = {
+            "Accept": "application/vnd.github+json",
+            "X-GitHub-Api-Version": "2022-11-28",
+        }
+        if self._token:
+            headers["Authorization"] = f"Bearer {self._token}"
+        self._client = httpx.AsyncClient(
+            base_url=self._api_url,
+            headers=headers,
+            http2=True,
+            follow_redirects=True,
+            timeout=httpx.Timeout(60.0, read=600.0),
+            limits=httpx.Limits(
+                max_connections=self._max_concurrency,
+                max_keepalive_connections=self._max_concurrency,
+            ),
+        )
+        return self
+
+    async def __aexit__(self, *_):
+        await self._client.aclose()
+        self._client = None
+
+    async def _request(
+        self,
+        method: str,
+        url: str,
+        content: Optional[Callable[[], AsyncIterator[bytes]]] = None,
+        **kwargs,
+    ) -> httpx.Response:
+        """
+        Sends request respecting concurrency and rate limits, retrying rate limited requests.
+
+        Request body is given as a factory, so it can be streamed again when request is retried.
+        """
+
+        for _ in range(self._max_retries + 1):
+            async with self._limiter:
+                response = await self._client.request(
+                    method, url, content=content() if content else None, **kwargs
+                )
+            retry_after = self._limiter.update(response)
+            if retry_after is None:
+                response.raise_for_status()
+                return response
+            await asyncio.sleep(retry_after)
+        response.raise_for_status()
+        return response
+
+    async def get_release(self, tag: str) -> dict:
+        """
+        Gets release by its tag (cached for the lifetime of the client).
+
+        Args:
+            tag: Tag of the release.
+
+        Returns: Release as returned by GitHub REST API.
+        """
+
+        if tag not in self._releases:
+            response = await self._request(
+                "GET", f"/repos/{self._repository}/releases/tags/{tag}"
+            )
+            self._releases[tag] = response.json()
+        return self._releases[tag]
+
+    async def list_assets(self, tag: str) -> List[ReleaseAsset]:
+        """Lists all assets of the release with given tag."""
+
+        release = await self.get_release(tag)
+        assets = []
+        page = 1
+        while True:
+            response = await self._request(
+                "GET",
+                f"/repos/{self._repository}/releases/{release['id']}/assets",
+                params={"per_page": 100, "page": page},
+            )
+            batch = response.json()
+            assets.extend(ReleaseAsset.model_validate(asset) for asset in batch)
+            if len(batch) < 100:
+                return assets
+            page += 1
+
+    async def find_asset(self, tag: str, name: str) -> Optional[ReleaseAsset]:
+        """Finds asset with given name in the release (`None` if it does not exist)."""
+        return next(
+            (asset for asset in await self.list_assets(tag) if asset.name == name),
+            None,
+        )
+
+    async def asset_exists(self, tag: str, name: str) -> bool:
+        """Verifies if asset with given name exists in the release."""
+        return await self.find_asset(tag, name) is not None
+
+    async def download_asset(self, asset: ReleaseAsset, path: str):
+        """
+        Downloads release asset by streaming it to a file.
+
+        Args:
+            asset: Asset to download.
+            path: Output file path.
+        """
+
+        url = f"/repos/{self._repository}/releases/assets/{asset.id}"
+        for _ in range(self._max_retries + 1):
+            async with self._limiter:
+                async with self._client.stream(
+                    "GET", url, headers={"Accept": "application/octet-stream"}
+                ) as response:
+                    retry_after = self._limiter.update(response)
+                    if retry_after is None:
+                        response.raise_for_status()
+                        with open(path, "wb") as output:
+                            async for chunk in response.aiter_bytes(1024 * 1024):
+                                output.write(chunk)
+                        return
+            await asyncio.sleep(retry_after)
+        raise RuntimeError(f"Download of asset '{asset.name}' was rate limited!")
+
+    async def upload_asset(
+        self, tag: str, path: str, content_type: str, name: Optional[str] = None
+    ) -> ReleaseAsset:
+        """
+        Uploads file as release asset.
+
+        Args:
+            tag: Tag of the release.
+            path: Path of the file to upload.
+            content_type: Content type of the asset.
+            name: Name of the asset (file name if not set).
+
+        Returns: Uploaded asset.
+        """
+
+        release = await self.get_release(tag)
+        upload_url = release["upload_url"].split("{", 1)[0]
+
+        async def content() -> AsyncIterator[bytes]:
+            with open(path, "rb") as file:
+                for chunk in iter(lambda: file.read(1024 * 1024), b""):
+                    yield chunk
+
+        response = await self._request(
+            "POST",
+            upload_url,
+            params={"name": name or os.path.basename(path)},
+            headers={
+                "Content-Type": content_type,
+                "Content-Length": str(os.path.getsize(path)),
+            },
+            content=content,
+        )
+        return ReleaseAsset.model_validate(response.json())
@@ -1,9 +1,11 @@
 import os
+from typing import Literal, Optional
 
 from pydantic import Field
 
 from archive.paths import get_output_dir_from_archive_path
 from sysroot.tags import DockerImageTags
+from disk.budget import GiB
 from toolchain.base import ToolchainBaseApp, ToolchainBaseArgs
 
 
@@ -16,72 +18,70 @@ class BuildSysrootArgs(ToolchainBaseArgs):
 
     glibc_version: str = Field(..., description="Version of glibc to build.")
 
+    profile: Optional[Literal["full", "slim"]] = Field(
+        default=None,
+        description="Content of sysroot archive, slim keeps only headers, crt objects, libraries and linker scripts (full by default).",
+    )
+
 
 class BuildSysrootApp(ToolchainBaseApp[BuildSysrootArgs]):
     """Build linux kernel and glibc as a base for building cross compilers with hermetic sysroot."""
 
     def __init__(self):
-        super().__init__("sysroot", DockerImageTags.SYSROOT)
+        super().__init__("sysroot", DockerImageTags.SYSROOT, DockerImageTags.BASE)
         self._build_path = os.path.dirname(os.path.abspath(__file__))
-        self._linux_kernel_dockerfile = "Dockerfile.kernel"
-        self._glibc_dockerfile = "Dockerfile.glibc"
+        self._sysroot_dockerfile = "Dockerfile.sysroot"
+        self._slim_profile_path = os.path.join(self._build_path, "slim_profile.json")
 
     @property
     def _release_asset_name(self):
         """Returns sysroot artifact name as uploaded to release artifacts."""
-        return f"sysroot-linux-kernel-{self.args.linux_kernel_version}+glibc-{self.args.glibc_version}-x86_64-linux-gnu.tar.xz"
+        profile = "-slim" if self.args.profile == "slim" else ""
+        return f"sysroot-linux-kernel-{self.args.linux_kernel_version}+glibc-{self.args.glibc_version}{profile}-x86_64-linux-gnu.tar.xz"
 
-    def _build_linux_kernel(self):
-        """Builds linux kernel docker image."""
+    @property
+    def _prune_profile_path(self):
+        """Returns profile dropping locales, gconv modules, documentation and binaries from slim sysroot."""
+        return self._slim_profile_path if self.args.profile == "slim" else None
 
-        self.logger.info(f"Building linux kernel v{self.args.linux_kernel_version}...")
-        response = self.docker.api.build(
-            path=self._build_path,
-            dockerfile=self._linux_kernel_dockerfile,
-            tag=DockerImageTags.LINUX_KERNEL,
-            rm=True,
-            decode=True,
-            buildargs={
-                "INSTALL_DIR": get_output_dir_from_archive_path(
-                    self._release_asset_name
-                ),
-                "LINUX_KERNEL_VERSION": self.args.linux_kernel_version,
-            },
+    @property
+    def _build_disk_estimate(self):
+        """Returns estimated disk space used by kernel headers and glibc build."""
+        return 8 * GiB
+
+    @property
+    def _export_disk_estimate(self):
+        """Returns estimated disk space used by sysroot archives."""
+        return 1 * GiB
+
+    def _build_sysroot(self):
+        """
+        Builds linux kernel headers and glibc as a single multi-stage docker image.
+
+        Kernel headers and glibc sources are fetched in independent stages, which BuildKit
+        runs concurrently and only joins them at glibc configure step.
+        """
+
+        self.logger.info(
+            f"Building linux kernel v{self.args.linux_kernel_version} and glibc v{self.args.glibc_version}..."
         )
-        for chunk in response:
-            if "stream" in chunk:
-                self.logger.info(chunk["stream"].strip())
-            if "error" in chunk:
-                raise RuntimeError(chunk["error"].strip())
-        self.logger.info(f"Linux kernel was successfully built!")
-
-    def _build_glibc(self):
-        """Builds glibc docker image."""
-
-        self.logger.info(f"Building glibc v{self.args.glibc_version}...")
-        response = self.docker.api.build(
+        self._docker_build(
             path=self._build_path,
-            dockerfile=self._glibc_dockerfile,
+            dockerfile=self._sysroot_dockerfile,
             tag=DockerImageTags.SYSROOT,
-            rm=True,
-            decode=True,
             buildargs={
                 "INSTALL_DIR": get_output_dir_from_archive_path(
                     self._release_asset_name
                 ),
+                "LINUX_KERNEL_VERSION": self.args.linux_kernel_version,
                 "GLIBC_VERSION": self.args.glibc_version,
             },
+            buildkit=True,
         )
-        for chunk in response:
-            if "stream" in chunk:
-                self.logger.info(chunk["stream"].strip())
-            if "error" in chunk:
-                raise RuntimeError(chunk["error"].strip())
-        self.logger.info(f"glibc was successfully built!")
+        self.logger.info("Sysroot was successfully built!")
 
     def _build_toolchain(self):
-        self._build_linux_kernel()
-        self._build_glibc()
+        self._build_sysroot()
 
 
 BuildSysrootApp.exec(__name__)
@@ -0,0 +1,105 @@
+import json
+from typing import Dict, List, Tuple
+
+
+def _format_bytes(size: float) -> str:
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if abs(size) < 1024:
+            return f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}TiB"
+
+
+def load_samples(path: str) -> List[Dict]:
+    """Loads samples written by `ContainerStatsSampler` from JSON lines file."""
+    with open(path, "r") as samples_file:
+        return [json.loads(line) for line in samples_file if line.strip()]
+
+
+def find_low_parallelism(
+    samples: List[Dict], ncpu: int, threshold: float = 0.25, min_duration: float = 60.0
+) -> List[Tuple[float, float, str, str, str]]:
+    """
+    Finds continuous stretches where build used only a small fraction of available CPUs.
+
+    Args:
+        samples: Samples in chronological order.
+        ncpu: Number of CPUs available to the build.
+        threshold: Fraction of CPUs under which the build is considered under-utilized.
+        min_duration: Minimum length of reported stretch in seconds.
+
+    Returns: List of stretches as (start, end, step, first progress, last progress).
+    """
+
+    stretches = []
+    current: List[Dict] = []
+
+    def close_stretch():
+        if current and current[-1]["t"] - current[0]["t"] >= min_duration:
+            first, last = current[0], current[-1]
+            stretches.append(
+                (
+                    first["t"],
+                    last["t"],
+                    first["step"],
+                    first["progress"],
+                    last["progress"],
+                )
+            )
+
+    for sample in samples:
+        low = sample["cpu"] < threshold * ncpu
+        if low and current and sample["step"] == current[0]["step"]:
+            current.append(sample)
+            continue
+        close_stretch()
+        current = [sample] if low else []
+    close_stretch()
+    return stretches
+
+
+def render_report(samples: List[Dict], ncpu: int) -> str:
+    """
+    Renders per-step utilization report.
+
+    Args:
+        samples: Samples in chronological order.
+        ncpu: Number of CPUs available to the build.
+
+    Returns: Report text.
+    """
+
+    if not samples:
+        return "No resource samples collected."
+
+    steps: Dict[str, List[Dict]] = {}
+    for sample in samples:
+        steps.setdefault(sample["step"], []).append(sample)
+
+    lines = [
+        f"{'duration':>9} {'cpu':>6} {'util':>5} {'peak mem':>10} {'read':>10} {'write':>10} {'net':>10}  step"
+    ]
+    previous_io = {"rd": 0, "wr": 0, "rx": 0, "tx": 0}
+    for step, step_samples in steps.items():
+        duration = step_samples[-1]["t"] - step_samples[0]["t"]
+        mean_cpu = sum(sample["cpu"] for sample in step_samples) / len(step_samples)
+        last = step_samples[-1]
+        io = {key: last[key] - previous_io[key] for key in previous_io}
+        previous_io = {key: last[key] for key in previous_io}
+        lines.append(
+            f"{duration:>8.0f}s {mean_cpu:>6.1f} {mean_cpu / ncpu:>5.0%} "
+            f"{_format_bytes(max(sample['mem'] for sample in step_samples)):>10} "
+            f"{_format_bytes(io['rd']):>10} {_format_bytes(io['wr']):>10} "
+            f"{_format_bytes(io['rx'] + io['tx']):>10}  {step or '<unknown>'}"
+        )
+
+    stretches = find_low_parallelism(samples, ncpu)
+    if stretches:
+        lines.append("")
+        lines.append(f"Low parallelism stretches (< 25% of {ncpu} CPUs for >= 60s):")
+        for start, end, step, first, last in stretches:
+            progress = f" [{first} -> {last}]" if first or last else ""
+            lines.append(
+                f"  {start:.0f}s - {end:.0f}s ({end - start:.0f}s){progress}  {step}"
+            )
+    return "\n".join(lines)
@@ -0,0 +1,154 @@
+import json
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set, TextIO
+
+import docker
+from docker.errors import DockerException
+from requests.exceptions import RequestException
+
+_STEP_PATTERN = re.compile(r"^Step (\d+/\d+) : (.*)$")
+_BUILDKIT_STEP_PATTERN = re.compile(r"^#\d+ \[([^\]]+)\] (.*)$")
+_NINJA_PATTERN = re.compile(r"^(?:#\d+ \d+\.\d+ )?\[(\d+)/(\d+)\]")
+
+
+class ContainerStatsSampler:
+    """
+    Samples resource usage of containers running during a Docker build.
+
+    Every sample aggregates CPU, memory, block I/O and network usage of all containers started
+    after sampling began (i.e. intermediate build containers) and is tagged with the current build
+    step and ninja progress. Samples are appended to a JSON lines file with following keys:
+    `t` (seconds since start), `step`, `progress`, `cpu` (used cores), `mem` (bytes),
+    `rd`/`wr` (block I/O bytes) and `rx`/`tx` (network bytes) - I/O counters are cumulative since start.
+
+    Usage:
+        with ContainerStatsSampler(client, output) as sampler:
+            for line in build_log:
+                sampler.observe(line)
+    """
+
+    def __init__(
+        self, client: docker.DockerClient, output: TextIO, interval: float = 5.0
+    ):
+        """
+        Args:
+            client: Docker client of the daemon running the build.
+            output: Text stream where samples are written.
+            interval: Sampling interval in seconds.
+        """
+
+        self._client = client
+        self._output = output
+        self._interval = interval
+        self._ignored: Set[str] = set()
+        self._previous_cpu: Dict[str, tuple] = {}
+        self._io_totals: Dict[str, Dict[str, int]] = {}
+        self._step = ""
+        self._progress = ""
+        self._start = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.samples: List[Dict[str, Any]] = []
+        """Samples collected since sampling began."""
+
+    def __enter__(self) -> "ContainerStatsSampler":
+        self._ignored = {container.id for container in self._client.containers.list()}
+        self._start = time.monotonic()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *_):
+        self._stop.set()
+        self._thread.join()
+
+    def observe(self, line: str):
+        """
+        Updates current build step and ninja progress from a build log line.
+
+        Args:
+            line: Single line of the build output.
+        """
+
+        line = line.strip()
+        step = _STEP_PATTERN.match(line) or _BUILDKIT_STEP_PATTERN.match(line)
+        if step:
+            self._step = f"{step.group(1)} {step.group(2)}"[:120]
+            self._progress = ""
+            return
+        progress = _NINJA_PATTERN.match(line)
+        if progress:
+            self._progress = f"{progress.group(1)}/{progress.group(2)}"
+
+    def _run(self):
+        while not self._stop.wait(self._interval):
+            try:
+                sample = self._sample()
+            except (DockerException, RequestException):
+                continue
+            if sample is not None:
+                self.samples.append(sample)
+                self._output.write(json.dumps(sample, separators=(",", ":")) + "\n")
+                self._output.flush()
+
+    def _container_usage(self, container_id: str) -> Optional[Dict[str, Any]]:
+        stats = self._client.api.stats(container_id, stream=False, one_shot=True)
+        if not stats.get("cpu_stats"):
+            return None
+
+        # CPU usage is calculated from the difference to previous sample of the same container
+        cpu_stats = stats["cpu_stats"]
+        total = cpu_stats.get("cpu_usage", {}).get("total_usage", 0)
+        system = cpu_stats.get("system_cpu_usage", 0)
+        online = cpu_stats.get("online_cpus") or 1
+        cores = 0.0
+        previous = self._previous_cpu.get(container_id)
+        if previous is not None and system > previous[1]:
+            cores = (total - previous[0]) / (system - previous[1]) * online
+        self._previous_cpu[container_id] = (total, system)
+
+        io = {"rd": 0, "wr": 0}
+        for entry in (stats.get("blkio_stats") or {}).get(
+            "io_service_bytes_recursive"
+        ) or []:
+            if entry.get("op", "").lower() == "read":
+                io["rd"] += entry.get("value", 0)
+            elif entry.get("op", "").lower() == "write":
+                io["wr"] += entry.get("value", 0)
+        networks = stats.get("networks") or {}
+        io["rx"] = sum(network.get("rx_bytes", 0) for network in networks.values())
+        io["tx"] = sum(network.get("tx_bytes", 0) for network in networks.values())
+        self._io_totals[container_id] = io
+
+        return {"cpu": cores, "mem": stats.get("memory_stats", {}).get("usage", 0)}
+
+    def _sample(self) -> Optional[Dict[str, Any]]:
+        containers = [
+            container
+            for container in self._client.containers.list()
+            if container.id not in self._ignored
+        ]
+        if not containers:
+            return None
+
+        sample: Dict[str, Any] = {
+            "t": round(time.monotonic() - self._start, 1),
+            "step": self._step,
+            "progress": self._progress,
+            "cpu": 0.0,
+            "mem": 0,
+        }
+        for container in containers:
+            usage = self._container_usage(container.id)
+            if usage is not None:
+                sample["cpu"] += usage["cpu"]
+                sample["mem"] += usage["mem"]
+
+        # I/O counters include finished containers of the build (one container per step)
+        for key in ("rd", "wr", "rx", "tx"):
+            sample[key] = sum(totals[key] for totals in self._io_totals.values())
+        sample["cpu"] = round(sample["cpu"], 2)
+        return sample
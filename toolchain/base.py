@@ -1,12 +1,37 @@
 from abc import abstractmethod
-import lzma
+import asyncio
+import importlib
 import os
-from typing import TypeVar
+import subprocess
+from typing import Dict, Iterator, List, Optional, Tuple, TypeVar
 
+from docker.errors import APIError
 from pydantic import BaseModel, Field
 
-from archive.paths import get_output_dir_from_archive_path
+from archive.canonical import CanonicalTar
+from archive.components import ComponentsManifest, split_archive
+from archive.delta import create_delta
+from archive.extract import extract_archive
+from archive.paths import (
+    get_output_dir_from_archive_path,
+    get_prefix_from_archive_path,
+    get_sidecar_path,
+)
+from archive.prune import PruneProfile, prune_members
+from archive.seekable import write_seekable_archive
+from archive.stream import iter_tar_members, open_chunk_stream, write_xz_archive
 from cli.app import CliApp
+from disk.budget import (
+    DiskBudget,
+    GiB,
+    docker_candidates,
+    path_candidates,
+    unpack_cache_candidates,
+)
+from farm.pool import DockerWorker
+from release.client import AsyncReleaseClient
+from telemetry.report import render_report
+from telemetry.sampler import ContainerStatsSampler
 
 
 class ToolchainBaseArgs(BaseModel):
@@ -23,6 +48,31 @@ class ToolchainBaseArgs(BaseModel):
         description="If set rebuilds and reuploads existing toolchain builds for given release version (yes/no).",
     )
 
+    seekable_archive: Optional[bool] = Field(
+        default=None,
+        description="If set compresses toolchain archive in frames aligned to tar members and uploads member index (yes/no).",
+    )
+
+    telemetry_path: Optional[str] = Field(
+        default=None,
+        description="If set samples resource usage of build containers into given JSON lines file and logs utilization report.",
+    )
+
+    telemetry_interval: Optional[float] = Field(
+        default=None,
+        description="Resource usage sampling interval in seconds (default 5).",
+    )
+
+    split_components: Optional[bool] = Field(
+        default=None,
+        description="If set additionally uploads toolchain split into component archives with an index asset (yes/no).",
+    )
+
+    delta_base: Optional[str] = Field(
+        default=None,
+        description="Path to previous toolchain archive, if set additionally uploads binary delta against it.",
+    )
+
 
 TToolchainArgs = TypeVar("TToolchainArgs", bound=ToolchainBaseArgs)
 
@@ -30,47 +80,203 @@ TToolchainArgs = TypeVar("TToolchainArgs", bound=ToolchainBaseArgs)
 class ToolchainBaseApp(CliApp[TToolchainArgs]):
     """Base class for CLI application used to build toolchain."""
 
-    def __init__(self, name: str, toolchain_image_tag: str):
+    def __init__(self, name: str, toolchain_image_tag: str, base_image_tag: str):
         super().__init__(name)
         self._image_tag = toolchain_image_tag
-        self._release_cache = None
-        self._release_artifacts_cache = None
+        self._base_image_tag = base_image_tag
+        self._unpacked_paths: List[str] = []
+        self._artifact_paths: List[str] = []
+        self._worker: Optional[DockerWorker] = None
+        self._disk_budget: Optional[DiskBudget] = None
+        self._assets: List[Tuple[str, str]] = []
+        self._component_paths: List[str] = []
+        self._components_index_path: Optional[str] = None
 
-    @property
-    def _release(self):
-        if self._release_cache is None:
-            repo = self.github.get_repo(self.args.repository)
-            self._release_cache = repo.get_release(self.args.release_id)
-        return self._release_cache
+    def _release_client(self) -> AsyncReleaseClient:
+        """Creates client of the target repository releases (release lookups are shared through context)."""
 
-    @property
-    def _release_assets(self):
-        if self._release_artifacts_cache is None:
-            self._release_artifacts_cache = self._release.get_assets()
-        return self._release_artifacts_cache
+        if "GITHUB_TOKEN" not in os.environ:
+            raise EnvironmentError("Environment variable 'GITHUB_TOKEN' not set!")
+        release_cache = None
+        if self.context is not None:
+            release_cache = self.context.releases.setdefault(self.args.repository, {})
+        return AsyncReleaseClient(self.args.repository, release_cache=release_cache)
 
     @property
     @abstractmethod
     def _release_asset_name(self) -> str:
         """Gets the name of the release asset that will be uploaded to GitHub releases"""
 
-    def _check_if_already_exists(self):
-        """Verifies if requested toolchain is already built and uploaded to release assets."""
+    @property
+    def _input_archives(self) -> List[str]:
+        """Gets paths of archives unpacked as build inputs (used to estimate disk usage)."""
+        return []
 
-        return (
-            next(
-                (
-                    asset
-                    for asset in self._release_assets
-                    if asset.name == self._release_asset_name
-                ),
-                None,
+    @property
+    def _build_disk_estimate(self) -> int:
+        """Gets estimated disk space (in bytes) used by docker build of the toolchain."""
+        return 10 * GiB
+
+    @property
+    def _export_disk_estimate(self) -> int:
+        """Gets estimated disk space (in bytes) used by extracted and compressed toolchain archives."""
+        return 5 * GiB
+
+    @property
+    def _components_manifest_path(self) -> Optional[str]:
+        """Gets path to the manifest used to split toolchain into components (`None` if not supported)."""
+        return None
+
+    @property
+    def _prune_profile_path(self) -> Optional[str]:
+        """Gets path to the profile selecting files kept in toolchain archive (`None` keeps everything)."""
+        return None
+
+    def _docker_build(
+        self,
+        path: str,
+        dockerfile: str,
+        tag: str,
+        buildargs: Dict[str, str],
+        buildkit: bool = False,
+    ):
+        """
+        Builds docker image and forwards build output to the logger.
+
+        Classic builder (docker API) executes stages of multi-stage Dockerfile one after another,
+        builds requesting `buildkit` are executed through docker CLI with BuildKit, which runs
+        independent stages concurrently.
+
+        If telemetry is enabled, resource usage of build containers is sampled during the build.
+        """
+
+        if buildkit:
+            output = self._buildkit_build_output(path, dockerfile, tag, buildargs)
+        else:
+            output = self._classic_build_output(path, dockerfile, tag, buildargs)
+        if not self.args.telemetry_path:
+            self._forward_build_output(output)
+            return
+
+        if buildkit:
+            # BuildKit runs build steps outside of Docker containers
+            self.logger.warning(
+                f"Resource usage of BuildKit build '{tag}' can not be sampled, only build log is recorded."
             )
-            is not None
+        with open(self.args.telemetry_path, "a") as telemetry_file:
+            with ContainerStatsSampler(
+                self.docker, telemetry_file, self.args.telemetry_interval or 5.0
+            ) as sampler:
+                self._forward_build_output(output, sampler)
+
+        self.logger.info(
+            f"Resource utilization of '{tag}' build:\n"
+            + render_report(sampler.samples, int(self.docker.info().get("NCPU", 1)))
         )
 
-    def _upload_artifacts(self):
-        """Extracts built toolchain and uploads it to release assets."""
+    def _classic_build_output(
+        self, path: str, dockerfile: str, tag: str, buildargs: Dict[str, str]
+    ) -> Iterator[str]:
+        """Builds image through docker API and yields lines of the build output."""
+
+        response = self.docker.api.build(
+            path=path,
+            dockerfile=dockerfile,
+            tag=tag,
+            rm=True,
+            decode=True,
+            buildargs=buildargs,
+        )
+        for chunk in response:
+            if "stream" in chunk:
+                yield from chunk["stream"].strip().splitlines()
+            if "error" in chunk:
+                raise RuntimeError(chunk["error"].strip())
+
+    def _buildkit_build_output(
+        self, path: str, dockerfile: str, tag: str, buildargs: Dict[str, str]
+    ) -> Iterator[str]:
+        """Builds image through docker CLI with BuildKit and yields lines of the build output."""
+
+        env = dict(os.environ, DOCKER_BUILDKIT="1")
+        if self._worker is not None and self._worker.url is not None:
+            env["DOCKER_HOST"] = self._worker.url
+
+        command = [
+            "docker",
+            "build",
+            "--progress=plain",
+            f"--file={os.path.join(path, dockerfile)}",
+            f"--tag={tag}",
+        ]
+        for name, value in buildargs.items():
+            command.append(f"--build-arg={name}={value}")
+        command.append(path)
+
+        with subprocess.Popen(
+            command,
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+        ) as process:
+            for line in process.stdout:
+                yield line.rstrip()
+        if process.returncode != 0:
+            raise RuntimeError(
+                f"Docker build of '{tag}' failed with exit code {process.returncode}!"
+            )
+
+    def _forward_build_output(
+        self, output: Iterator[str], sampler: Optional[ContainerStatsSampler] = None
+    ):
+        """Logs build output lines and feeds them to the sampler."""
+
+        for line in output:
+            if sampler is not None:
+                sampler.observe(line)
+            self.logger.info(line)
+
+    def _unpack_archive(self, archive_path: str, output_path: str):
+        """
+        Unpacks .tar.xz archive into given directory using multithreaded extraction.
+
+        When running inside build agent, archive is unpacked once and reused through unpack cache.
+        """
+
+        self._unpacked_paths.append(output_path)
+        unpack_cache = self.context.unpack_cache if self.context else None
+        if unpack_cache is not None:
+            self.logger.info(f"Unpacking '{archive_path}' through unpack cache...")
+            hit = unpack_cache.materialize(archive_path, output_path)
+            self.logger.info(
+                f"Successfully unpacked '{archive_path}' (cache {'hit' if hit else 'miss'})!"
+            )
+            return
+
+        self.logger.info(f"Unpacking '{archive_path}'...")
+        stats = extract_archive(archive_path, output_path)
+        self.logger.info(
+            f"Successfully unpacked '{archive_path}' ({stats.files} files, {stats.bytes} bytes, {stats.files_per_second:.0f} files/s)!"
+        )
+
+    def _check_if_already_exists(self):
+        """Verifies if requested toolchain is already built and uploaded to release assets."""
+
+        async def asset_exists() -> bool:
+            async with self._release_client() as client:
+                return await client.asset_exists(
+                    self.args.release_id, self._release_asset_name
+                )
+
+        return asyncio.run(asset_exists())
+
+    def _export_artifacts(self):
+        """Extracts built toolchain into archives uploaded later to release assets."""
+
+        self._assets = []
+        self._component_paths = []
+        self._components_index_path = None
 
         # Create container from built image to extract the output
         toolchain_container = self.docker.containers.create(
@@ -84,29 +290,121 @@ class ToolchainBaseApp(CliApp[TToolchainArgs]):
                 f"Extracting {self._image_tag} from image to '{archive_path}'..."
             )
 
-            with lzma.open(archive_path, "wb") as output:
-                chunks, _ = toolchain_container.get_archive(
-                    path=get_output_dir_from_archive_path(self._release_asset_name),
-                )
-                for chunk in chunks:
-                    output.write(chunk)
-            self.logger.info(
-                f"Successfully extracted {self._image_tag} to '{archive_path}'!"
+            chunks, _ = toolchain_container.get_archive(
+                path=get_output_dir_from_archive_path(self._release_asset_name),
             )
+            self._artifact_paths.append(archive_path)
+            members = iter_tar_members(open_chunk_stream(chunks))
+            if self._prune_profile_path is not None:
+                self.logger.info(
+                    f"Pruning archive with profile '{self._prune_profile_path}'..."
+                )
+                members = prune_members(
+                    members, PruneProfile.load(self._prune_profile_path)
+                )
 
-            # Upload to release assets
-            self.logger.info(f"Uploading {self._release_asset_name} to GitHub release")
-            asset = self._release.upload_asset(
-                path=archive_path, content_type="application/x-xz-compressed-tar"
+            index_path = None
+            manifest_path = get_sidecar_path(archive_path, ".manifest.json")
+            self._artifact_paths.append(manifest_path)
+            with CanonicalTar(members, spool_dir="/tmp") as canonical:
+                if self.args.seekable_archive:
+                    index_path = write_seekable_archive(
+                        canonical.members(), archive_path
+                    )
+                else:
+                    write_xz_archive(canonical.members(), archive_path)
+                canonical.manifest(self._release_asset_name).save(manifest_path)
+            self.logger.info(
+                f"Deduplicated {canonical.deduplicated} of {canonical.files} files ({canonical.deduplicated_bytes} bytes)."
             )
             self.logger.info(
-                f"Asset {self._release_asset_name} successfully uploaded to GitHub release (id={asset.id})!"
+                f"Successfully extracted {self._image_tag} to '{archive_path}'!"
             )
 
         finally:
             # Cleanup container
             self.docker.api.remove_container(toolchain_container.id)
 
+        self._assets.append((archive_path, "application/x-xz-compressed-tar"))
+        self._assets.append((manifest_path, "application/json"))
+        if index_path is not None:
+            self._artifact_paths.append(index_path)
+            self._assets.append((index_path, "application/json"))
+
+        if self.args.split_components:
+            self._split_components(archive_path)
+
+        if self.args.delta_base:
+            self._create_delta(archive_path)
+
+    def _upload_artifacts(self):
+        """Uploads exported archives to release assets."""
+        asyncio.run(self._upload_assets())
+
+    async def _upload_assets(self):
+        """
+        Uploads exported archives to release assets concurrently over a pooled connection.
+
+        Components index is uploaded last so it is never published with missing components.
+        """
+
+        async def upload(client: AsyncReleaseClient, path: str, content_type: str):
+            name = os.path.basename(path)
+            self.logger.info(f"Uploading {name} to GitHub release")
+            asset = await client.upload_asset(self.args.release_id, path, content_type)
+            self.logger.info(
+                f"Asset {name} successfully uploaded to GitHub release (id={asset.id})!"
+            )
+
+        assets = self._assets + [
+            (path, "application/x-xz-compressed-tar") for path in self._component_paths
+        ]
+        async with self._release_client() as client:
+            await asyncio.gather(
+                *(upload(client, path, content_type) for path, content_type in assets)
+            )
+            if self._components_index_path is not None:
+                await upload(client, self._components_index_path, "application/json")
+
+    def _create_delta(self, archive_path: str):
+        """Creates binary delta of the toolchain archive against previous archive."""
+
+        delta_path = get_sidecar_path(
+            archive_path,
+            f".from-{get_prefix_from_archive_path(self.args.delta_base)}.delta",
+        )
+        self._artifact_paths.append(delta_path)
+        self.logger.info(
+            f"Creating delta of '{archive_path}' against '{self.args.delta_base}'..."
+        )
+        stats = create_delta(
+            self.args.delta_base, archive_path, delta_path, spool_dir="/tmp"
+        )
+        self.logger.info(
+            f"Delta has {stats.added} added, {stats.removed} removed, {stats.changed} changed and "
+            f"{stats.unchanged} unchanged entries ({os.path.getsize(delta_path)} of {os.path.getsize(archive_path)} bytes)."
+        )
+        self._assets.append((delta_path, "application/x-xz"))
+
+    def _split_components(self, archive_path: str):
+        """Splits extracted toolchain into component archives with index."""
+
+        if self._components_manifest_path is None:
+            self.logger.warning(
+                f"No components manifest defined for {self._image_tag}, skipping component archives!"
+            )
+            return
+
+        self.logger.info(f"Splitting '{archive_path}' into component archives...")
+        manifest = ComponentsManifest.load(self._components_manifest_path)
+        component_paths, index_path = split_archive(archive_path, manifest)
+        self._artifact_paths.extend(component_paths + [index_path])
+        self._component_paths = component_paths
+        self._components_index_path = index_path
+        self.logger.info(
+            f"Successfully split '{archive_path}' into {len(component_paths)} components!"
+        )
+
     @abstractmethod
     def _build_toolchain(self):
         """
@@ -130,6 +428,107 @@ class ToolchainBaseApp(CliApp[TToolchainArgs]):
             )
             return
 
+        # Only build and export are rescheduled if worker fails, assets are uploaded once
+        try:
+            self.worker_pool.run(self._build_on_worker)
+            self._upload_artifacts()
+        finally:
+            if self._disk_budget is not None:
+                self._disk_budget.release(self._artifact_paths)
+
+    def _build_on_worker(self, worker: DockerWorker):
+        """Builds and exports toolchain using Docker daemon of the given worker."""
+
+        self._docker = worker.client
+        self._worker = worker
+        self.worker_pool.transfer_image(self._base_image_tag, worker)
+
+        budget = self._create_disk_budget(worker)
+        self._disk_budget = budget
+        unpack_estimate = sum(
+            6 * os.path.getsize(path)
+            for path in self._input_archives
+            if path and os.path.exists(path)
+        )
+        # Docker API does not report free space of remote machines, only local disk is budgeted for them
+        docker_estimate = self._build_disk_estimate if worker.is_local else 0
+        budget.ensure("build", unpack_estimate + docker_estimate)
+
         self._build_toolchain()
 
-        self._upload_artifacts()
+        # Unpacked inputs are part of the built image now
+        budget.release(self._unpacked_paths)
+        try:
+            self.docker.images.prune(filters={"dangling": True})
+        except APIError as error:
+            self.logger.warning(f"Failed to prune dangling images: {error}")
+
+        budget.ensure("export", self._export_disk_estimate)
+        self._export_artifacts()
+
+    def _create_disk_budget(self, worker: DockerWorker) -> DiskBudget:
+        """Creates disk budget covering local caches, temporary artifacts and Docker storage of local worker."""
+
+        root_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        paths = ["/tmp", self._build_path]
+        if worker.is_local:
+            docker_root = worker.client.info().get("DockerRootDir")
+            if docker_root and os.path.isdir(docker_root):
+                paths.append(docker_root)
+        budget = DiskBudget(paths, self.logger)
+
+        # Leftovers of previous builds on this machine
+        budget.add_source(
+            path_candidates(
+                [
+                    os.path.join("/tmp", pattern)
+                    for pattern in (
+                        "sysroot-*",
+                        "gcc-*",
+                        "clang+llvm-*",
+                        "libclang-*",
+                        "canonical-tar-*",
+                    )
+                ]
+                + [
+                    os.path.join(root_path, "*", "ci", "sysroot"),
+                    os.path.join(root_path, "*", "ci", "*-host"),
+                    os.path.join(root_path, "ci", "cache", "docker", "*", "*.tar"),
+                ],
+                exclude=self._input_archives
+                + ([self.args.delta_base] if self.args.delta_base else []),
+            )
+        )
+        if self.context is not None and self.context.unpack_cache is not None:
+            budget.add_source(
+                unpack_cache_candidates(
+                    self.context.unpack_cache, exclude=self._input_archives
+                )
+            )
+
+        # Images of remote workers do not use local disk
+        if not worker.is_local:
+            return budget
+
+        # Base images are shared by builds of all toolchains, built image is exported later
+        image_tags = []
+        keep_tags = [self._image_tag]
+        for toolchain in ("sysroot", "gcc", "clang"):
+            tags = getattr(
+                importlib.import_module(f"{toolchain}.tags"), "DockerImageTags"
+            )
+            image_tags.extend(
+                value
+                for name, value in vars(tags).items()
+                if name.isupper() and isinstance(value, str)
+            )
+            keep_tags.append(tags.BASE)
+        budget.add_source(
+            docker_candidates(
+                worker.client,
+                image_tags,
+                keep_tags=keep_tags,
+                exclusive=lambda: worker.reservations() <= 1,
+            )
+        )
+        return budget